@@ -0,0 +1,122 @@
+"""Small JSON API used by static/app.js.
+
+Favoriting, unfavoriting and paging work without a page reload: each
+is one small request that touches only the rows involved and reads
+search results from the caches, instead of a form post, a redirect and
+a full re-render of the page. The HTML forms keep working without
+JavaScript.
+
+Requests that change data must send `X-Requested-With: XMLHttpRequest`.
+Browsers don't let other sites set that header without a CORS
+preflight, so it stands in for a CSRF token.
+"""
+
+from flask import Blueprint, g, jsonify, request, session
+
+from catalog import get_recipe_details, schedule_prefetch
+from feed import get_feed_page, FEED_PAGE_SIZE
+from models import db, Favorites
+from paging import get_page, PAGE_SIZE
+from recommend import schedule_recommendations
+from spoonacular import SpoonacularError
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+def error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    return response
+
+
+def card(recipe):
+    return {'id': recipe['id'], 'title': recipe['title'], 'image': recipe.get('image')}
+
+
+@api.before_request
+def check_request():
+    if request.method != 'GET' and request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return error('X-Requested-With header required', 400)
+    # only the homepage feed is public
+    if not g.user and request.endpoint != 'api.feed_page':
+        return error('Sign in required', 401)
+
+
+@api.route('/favorites/<int:recipe_id>', methods=['POST'])
+def add_favorite(recipe_id):
+    """Add recipe to the signed in user's favorites."""
+
+    try:
+        # makes sure recipe is in the catalog
+        get_recipe_details(recipe_id)
+    except SpoonacularError:
+        return error('Recipe could not be loaded, try again later', 503)
+
+    Favorites.add(g.user.id, recipe_id)
+    db.session.commit()
+    schedule_recommendations(g.user.id)
+    return jsonify({'recipe_id': recipe_id, 'favorite': True})
+
+
+@api.route('/favorites/<int:recipe_id>', methods=['DELETE'])
+def remove_favorite(recipe_id):
+    """Remove recipe from the signed in user's favorites."""
+
+    Favorites.remove(g.user.id, recipe_id)
+    db.session.commit()
+    schedule_recommendations(g.user.id)
+    return jsonify({'recipe_id': recipe_id, 'favorite': False})
+
+
+@api.route('/favorites')
+def favorites_page():
+    """Page of favorites after the `after` cursor, see Favorites.page."""
+
+    recipes, next_after = Favorites.page(g.user.id, request.args.get('after', type=int))
+    return jsonify({'recipes': [{'id': r.id, 'title': r.title, 'image': r.image}
+                                for r in recipes],
+                    'next_after': next_after})
+
+
+@api.route('/recipes')
+def recipes_page():
+    """Page of the user's current search starting at `index`.
+
+    The index is remembered in the session like the Back/Next buttons do,
+    so a reload shows the same page.
+    """
+
+    query = session.get('query', '')
+    index = max(request.args.get('index', 0, type=int), 0)
+    total = session.get('total')
+    if total is not None and index >= total:
+        index = max(total - 1, 0) // PAGE_SIZE * PAGE_SIZE
+
+    try:
+        recipes, total = get_page(query, index)
+    except SpoonacularError:
+        return error('Recipes could not be loaded, try again later', 503)
+    session['index'] = index
+    session['total'] = total
+    schedule_prefetch(query, index)
+
+    favs = Favorites.recipe_ids(g.user.id)
+    return jsonify({'recipes': [dict(card(r), favorite=r['id'] in favs) for r in recipes],
+                    'index': index,
+                    'total': total,
+                    'page_size': PAGE_SIZE})
+
+
+@api.route('/feed')
+def feed_page():
+    """Page of the anonymous homepage feed at `offset`."""
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    offset -= offset % FEED_PAGE_SIZE
+    recipes = get_feed_page(offset)
+    if recipes is None:
+        return error('Feed not built yet', 503)
+    session['offset'] = offset
+    return jsonify({'recipes': [card(r) for r in recipes],
+                    'offset': offset,
+                    'page_size': FEED_PAGE_SIZE})
@@ -1,73 +1,182 @@
-import os
+from collections import namedtuple
 
-from flask import Flask, render_template, request, flash, redirect, session, g, url_for
-from flask_debugtoolbar import DebugToolbarExtension
+import click
+from flask import (Blueprint, Flask, render_template, request, flash, redirect,
+                   session, g, url_for)
+from flask.cli import with_appcontext
+from werkzeug.local import LocalProxy
 from forms import UserAddForm, UserLoginForm, UserEditForm
 from sqlalchemy.exc import IntegrityError
+from config import get_config
 from models import db, connect_db, User, Recipe, Favorites
-from helper import get_recipes, get_recipe, get_query_string, convert_to_list
-from key import api_key
+from helper import get_recipes, get_query_string, response_cache
+from spoonacular import SpoonacularError, client
+from paging import get_page, PAGE_SIZE
+from jobs import enqueue
+from catalog import get_recipe_details, schedule_prefetch
+from search import reindex_catalog
+from sessions import PostgresSessionInterface
+from feed import build_homepage_feed, get_feed_page, LOCAL_TTL
+from recommend import build_recommendations, get_recommendations, schedule_recommendations
+from render_cache import render_cached, cached_page, page_etag, has_flashes
+from migrate import run_migrations
+from api import api
+import metrics
 
 
 CURR_USER_KEY = "curr_user"
+# slim copy of the logged in user kept in the signed session, see load_user
+USER_CARD_KEY = "curr_user_card"
 
-app = Flask(__name__)
+UserCard = namedtuple('UserCard', ['id', 'username', 'image_url'])
 
-# Get DB_URI from environ variable (useful for production/testing) or,
-# if not set there, use development local db.
-app.config['SQLALCHEMY_DATABASE_URI'] = (
-    os.environ.get('DATABASE_URL', 'postgresql:///meals'))
+views = Blueprint('views', __name__)
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "123")
-toolbar = DebugToolbarExtension(app)
-app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 
-connect_db(app)
-db.create_all()
+def create_app(config=None):
+    """Create the app with `config` (a config.py profile name or object).
 
+    Nothing here talks to the database; run `flask migrate` to set up
+    or upgrade the schema.
+    """
 
-@app.before_request
+    if config is None or isinstance(config, str):
+        config = get_config(config)
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    if app.config.get('DEBUG_TOOLBAR'):
+        from flask_debugtoolbar import DebugToolbarExtension
+        DebugToolbarExtension(app)
+
+    app.session_interface = PostgresSessionInterface()
+    connect_db(app)
+
+    metrics.init_app(app)
+    metrics.add_gauges('spoonacular', client.metrics)
+    metrics.add_gauges('response_cache', response_cache.stats)
+
+    app.register_blueprint(views)
+    app.register_blueprint(api)
+    for command in (migrate_command, reindex_catalog_command, build_feed_command,
+                    build_recommendations_command):
+        app.cli.add_command(command)
+    return app
+
+
+@click.command('migrate')
+@click.option('--mark-applied', is_flag=True,
+              help='Only record pending migrations, for databases migrated by hand.')
+@with_appcontext
+def migrate_command(mark_applied):
+    """Apply pending SQL migrations and create new tables."""
+
+    applied = run_migrations(mark_applied=mark_applied)
+    print(f'Applied {len(applied)} migrations: {", ".join(applied) or "none"}')
+
+
+@click.command('reindex-catalog')
+@with_appcontext
+def reindex_catalog_command():
+    """Recompute local search columns for all cached recipes."""
+
+    print(f'Reindexed {reindex_catalog()} recipes')
+
+
+@click.command('build-feed')
+@with_appcontext
+def build_feed_command():
+    """Rebuild the anonymous homepage feed."""
+
+    print(f'Feed built with {build_homepage_feed()} recipes')
+
+
+@click.command('build-recommendations')
+@with_appcontext
+def build_recommendations_command():
+    """Recompute "Recommended for you" for all users."""
+
+    print(f'Recommendations built for {build_recommendations()} users')
+
+
+def load_user():
+    """Return UserCard of the logged in user or None.
+
+    The card lives in the signed session, so the users table is only
+    queried when it is missing (e.g. sessions from before it existed).
+    """
+
+    user_id = session.get(CURR_USER_KEY)
+    if user_id is None:
+        return None
+
+    card = session.get(USER_CARD_KEY)
+    if not card or card[0] != user_id:
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        card = remember_user(user)
+    return UserCard(*card)
+
+def current_user():
+    """Load user once per request, on first use."""
+
+    if '_user' not in g:
+        g._user = load_user()
+    return g._user
+
+@views.before_app_request
 def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
+    """If we're logged in, add curr user to Flask global.
+    g.user is lazy: requests that never look at it cost nothing."""
 
-    if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
-        
-    else:
-        g.user = None
+    g.user = LocalProxy(current_user)
+
+def remember_user(user):
+    """Store/refresh user's card in the session."""
+
+    card = [user.id, user.username, user.image_url]
+    session[USER_CARD_KEY] = card
+    return card
 
 def do_login(user):
-    """Log in user."""
+    """Log in user, under a new session id."""
 
+    session.regenerate()
     session[CURR_USER_KEY] = user.id
+    remember_user(user)
 
 def do_logout():
-    """Logout user."""
+    """Logout user, removing their session."""
     
-    if CURR_USER_KEY in session:
-        del session[CURR_USER_KEY]
+    session.clear()
       
 
 
-@app.route('/')
+@views.route('/')
 def homepage():
     """Welcome page"""
     offset = session.get('offset',0)
-    if not session.get('random_recipes'):
 
-        try:
-            recipes = get_recipes(8,'',f'&offset={offset}')
-        except:
-            return render_template('error.html')
+    def get_context():
+        recipes_to_show = get_feed_page(offset)
+        if recipes_to_show is None:
+            # no feed built yet, ask upstream (response cache still applies)
+            recipes_to_show = get_recipes(8,'',f'&offset={offset}')
+        return {'recipes': recipes_to_show, 'offset': offset}
 
-        session['random_recipes'] = recipes
-    recipes_to_show = session['random_recipes']
+    try:
+        # page for anonymous visitors is the same for everyone at this offset
+        if g.user or has_flashes():
+            return render_template('homepage.html', **get_context())
+        page = render_cached(('homepage', offset), 'homepage.html', get_context, ttl=LOCAL_TTL)
+    except SpoonacularError:
+        return render_template('error.html')
 
-    return render_template('homepage.html', recipes = recipes_to_show)
+    return cached_page(page.etag, page.last_modified, lambda: page.body)
 
-@app.route('/recipes', methods=["POST"])
+@views.route('/recipes', methods=["POST"])
 def navigation_no_user():
     """Navigation setup for unauthorized users"""
 
@@ -80,11 +189,10 @@ def navigation_no_user():
         else:
             offset = 0
     session['offset'] = offset
-    session['random_recipes'] = []
 
     return redirect('/')
 
-@app.route('/register', methods=["GET", "POST"])
+@views.route('/register', methods=["GET", "POST"])
 def signup():
     """Handle user signup. Create new user and add to DB. 
     Redirect to user profile page. If the there already is a user with that username: 
@@ -112,7 +220,7 @@ def signup():
     else:
         return render_template('users/register.html', form=form)
     
-@app.route('/signin', methods=["GET", "POST"])
+@views.route('/signin', methods=["GET", "POST"])
 def signin():
     """Handle user login."""
 
@@ -123,6 +231,8 @@ def signin():
                                  form.password.data)
 
         if user:
+            # keeps a password rehashed at the current cost
+            db.session.commit()
             do_login(user)
             return redirect(f'/users/{user.id}')
 
@@ -131,16 +241,15 @@ def signin():
     return render_template('users/signin.html', form=form)
 
 
-@app.route('/logout')
+@views.route('/logout')
 def logout():
     """Handle logout of user."""
 
     do_logout()
-    session['recipes'] = []
-   
+
     return redirect('/signin')
 
-@app.route('/users/<int:user_id>', methods=["POST", "GET"])
+@views.route('/users/<int:user_id>', methods=["POST", "GET"])
 def user_homepage(user_id):
     """Show user's homepage with 5 random recipes of the day"""
     
@@ -155,31 +264,18 @@ def user_homepage(user_id):
     if request.method == "POST":
         clicked_recipe_id = request.form.get('rec_to_save')
 
-        if not Recipe.query.get(clicked_recipe_id):
-            fav_recipe = get_recipe(clicked_recipe_id)
-            recipe = Recipe(id = fav_recipe['id'],
-                            title = fav_recipe['title'],
-                            image = fav_recipe['image']
-                            )
-            db.session.add(recipe) 
-            db.session.commit() 
-
-        favorite = Favorites(recipe_id = clicked_recipe_id,
-                            user_id = user_id)
-        db.session.add(favorite)
-        db.session.commit()    
+        # makes sure recipe is in the catalog
+        try:
+            get_recipe_details(clicked_recipe_id)
+        except SpoonacularError:
+            return render_template('error.html')
+
+        Favorites.add(user_id, clicked_recipe_id)
+        db.session.commit()
+        schedule_recommendations(user_id)
         return redirect(f'/users/{user.id}')
 
-# ---------------get formatted preference dictionary-----------
-    prefs = {}
-    user_dict = user.__dict__
-    for key,value in user_dict.items():
-        if value and key in ['intolerances', 'cuisine', 'diet']:
-            prefs[key] = []
-            for val in convert_to_list(value):
-                if val != '':
-                    prefs[key].append(val)   
-    
+    prefs = user.prefs
     query = session.get('query', '')
 
 # -------------------- requesting with search forms------------------------
@@ -202,40 +298,46 @@ def user_homepage(user_id):
         session['query'] = query
 
     try:
-        recipe_list = get_recipes(100,query)
-    except: 
+        recipes_to_show, total = get_page(query, index)
+    except SpoonacularError:
         return render_template('error.html')
+    session['total'] = total
 
-    recipes_to_show = recipe_list[index:index+4]
+    # the next click is most likely one of these recipes
+    schedule_prefetch(query, index)
     
-    # create list of favorite ids to check if recipe needs an "add to favs" button 
-    favs = []
-    for fav in user.favorites:
-        favs.append(fav.id)
+    # favorite ids to check if recipe needs an "add to favs" button 
+    favs = Favorites.recipe_ids(user_id)
 
     return render_template('users/user_homepage.html', 
                             user=user,
                             prefs = prefs, 
                             recipes = recipes_to_show,
+                            recommended = get_recommendations(user_id),
+                            index = index,
+                            page_size = PAGE_SIZE,
                             favs = favs)
                            
-@app.route('/<int:user_id>/recipes', methods=["POST"])
+@views.route('/<int:user_id>/recipes', methods=["POST"])
 def navigation_user(user_id):
     """Pagination for authorized users"""
 
     index = session.get('index', 0)
+    total = session.get('total')
     if request.form.get('res_next') == 'Next >>>':
-        index = index + 4 
+        # stop at the last page of results
+        if total is None or index + PAGE_SIZE < total:
+            index = index + PAGE_SIZE
     elif request.form.get('res_back') == '<<< Back':
-        if index >= 4:
-            index = index - 4
+        if index >= PAGE_SIZE:
+            index = index - PAGE_SIZE
         else:
             index = 0
     session['index'] = index
     return redirect(f'/users/{user_id}')
 
 
-@app.route('/users/<int:user_id>/favorites', methods=["POST", "GET"])
+@views.route('/users/<int:user_id>/favorites', methods=["POST", "GET"])
 def show_favorite_recipes(user_id):
     """Show users favorite recipes"""
     
@@ -243,17 +345,21 @@ def show_favorite_recipes(user_id):
         flash("Access denied", "danger")
         return redirect('/')
 
-    user = User.query.get_or_404(user_id)
-    recipes = user.favorites
-
     if request.method == "POST":
-        Favorites.query.filter_by(recipe_id = request.form['rec_to_delete']).delete()
+        Favorites.remove(user_id, request.form['rec_to_delete'])
         db.session.commit()
+        schedule_recommendations(user_id)
         return redirect(f'/users/{user_id}/favorites')
 
-    return render_template('users/user_favorites.html', user = user, recipes = recipes)
+    after = request.args.get('after', type=int)
+    recipes, next_after = Favorites.page(user_id, after)
+
+    return render_template('users/user_favorites.html',
+                            user = g.user,
+                            recipes = recipes,
+                            next_after = next_after)
 
-@app.route('/users/<int:user_id>/update', methods = ["POST", "GET"])
+@views.route('/users/<int:user_id>/update', methods = ["POST", "GET"])
 def user_settings(user_id):
     """User settings page"""
 
@@ -269,23 +375,25 @@ def user_settings(user_id):
         user.username=form.username.data
         user.email=form.email.data
         user.image_url=form.image_url.data
-        user.diet=form.diet.data
-        user.intolerances=form.intolerances.data
-        user.cuisine=form.cuisine.data
-        user.excludeIngredients=form.excludeIngredients.data
+        user.update_preferences(diet=form.diet.data,
+                                intolerances=form.intolerances.data,
+                                cuisine=form.cuisine.data,
+                                excludeIngredients=form.excludeIngredients.data)
         db.session.commit()
-        
-        try:
-            recipes_list = get_recipes(f'&number=100', get_query_string(user))
-        except: 
-            return render_template('error.html')
-        recipes_to_show = recipes_list[0:4]
-        session['recipes'] = recipes_to_show
+        remember_user(user)
+
+        # show results for the new preferences, fetched by the job worker
+        # while the browser follows the redirect
+        query = get_query_string(user)
+        session['query'] = query
+        session['index'] = 0
+        session.pop('total', None)
+        enqueue('warm_page', query, 0, key=f'warm_page:0:{query}')
         return redirect(f'/users/{user_id}')
 
     return render_template('users/user_settings.html', user = user, form = form)
 
-@app.route('/recipes/<int:recipe_id>')
+@views.route('/recipes/<int:recipe_id>')
 def show_recipe_details(recipe_id):
     """Show recipe details"""
 
@@ -294,8 +402,18 @@ def show_recipe_details(recipe_id):
         return redirect('/register')
     
     try:
-        recipe = get_recipe(recipe_id)
-    except:
+        body = render_cached(('recipe', recipe_id), 'recipes/recipe_body.html',
+                             lambda: {'recipe': get_recipe_details(recipe_id)})
+    except SpoonacularError:
         return render_template('error.html')
 
-    return render_template("recipes/recipe.html", recipe = recipe)
\ No newline at end of file
+    if has_flashes():
+        return render_template("recipes/recipe.html", body = body.body)
+
+    # navbar shows the user, so the page version depends on them too
+    etag = page_etag(body.etag, g.user.id, g.user.username, g.user.image_url)
+    return cached_page(etag, body.last_modified,
+                       lambda: render_template("recipes/recipe.html", body = body.body))
+
+
+app = create_app()
@@ -0,0 +1,203 @@
+"""Load test: scripted user journeys against a running app.
+
+Each virtual user registers, signs out and back in, searches, pages
+through results, opens recipes, and saves and removes a favorite, then
+repeats the browsing part. Every request is timed on its own (redirects
+are followed as separate requests). At the end, requests per second and
+p50/p95/p99 latency are printed per route:
+
+    python bench/loadtest.py --base-url http://127.0.0.1:5000 --users 20 --iterations 5
+
+Run the app against bench/stub_server.py and a scratch database, never
+against production: the journey creates users.
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import urljoin
+
+import requests
+
+SEARCHES = ['pasta', 'soup', 'tacos', 'salad', 'curry']
+CSRF = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+RECIPE_LINK = re.compile(r'href="/recipes/(\d+)"')
+USER_PATH = re.compile(r'/users/(\d+)')
+ERROR_PAGE = 'Can not access the page.'
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted `values`."""
+
+    if not values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(values))))
+    return values[min(rank, len(values)) - 1]
+
+
+class Recorder:
+    """Latencies and errors per route, shared by all virtual users."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = Lock()
+
+    def add(self, route, seconds, ok):
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            rows.append({'route': route,
+                         'requests': len(values),
+                         'errors': self.errors[route],
+                         'rps': len(values) / elapsed,
+                         'p50_ms': percentile(values, 50) * 1000,
+                         'p95_ms': percentile(values, 95) * 1000,
+                         'p99_ms': percentile(values, 99) * 1000})
+        total = sum(row['requests'] for row in rows)
+        return {'elapsed_s': elapsed, 'requests': total, 'rps': total / elapsed, 'routes': rows}
+
+
+class VirtualUser:
+    """One browser session going through the journey."""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.username = f'bench-{uuid.uuid4().hex[:12]}'
+        self.password = 'bench-password'
+        self.user_id = None
+
+    def request(self, method, path, route, **kwargs):
+        """Send one request, time it under `route`, follow redirects one by one."""
+
+        start = time.perf_counter()
+        try:
+            res = self.http.request(method, urljoin(self.base_url, path),
+                                    allow_redirects=False, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(route, time.perf_counter() - start, ok=False)
+            return None
+        # upstream failures render error.html with a 200
+        ok = res.status_code < 400 and ERROR_PAGE not in res.text
+        self.recorder.add(route, time.perf_counter() - start, ok)
+
+        if res.is_redirect:
+            location = res.headers['Location']
+            return self.request('GET', location, f'GET {route_of(location)}')
+        return res
+
+    def form(self, path, route, data):
+        page = self.request('GET', path, f'GET {route}')
+        token = CSRF.search(page.text) if page is not None else None
+        if token:
+            data = dict(data, csrf_token=token.group(1))
+        return self.request('POST', path, f'POST {route}', data=data)
+
+    def register(self):
+        res = self.form('/register', '/register',
+                        {'username': self.username,
+                         'email': f'{self.username}@bench.test',
+                         'password': self.password})
+        match = USER_PATH.search(res.url) if res is not None else None
+        self.user_id = int(match.group(1)) if match else None
+
+    def sign_in(self):
+        self.request('GET', '/logout', 'GET /logout')
+        res = self.form('/signin', '/signin',
+                        {'username': self.username, 'password': self.password})
+        match = USER_PATH.search(res.url) if res is not None else None
+        if match:
+            self.user_id = int(match.group(1))
+
+    def browse(self):
+        user_path = f'/users/{self.user_id}'
+        page = self.request('GET', f'{user_path}?search_by_dish={random.choice(SEARCHES)}',
+                            'GET /users/<id>')
+        pages = [page]
+        for _ in range(3):
+            pages.append(self.request('POST', f'/{self.user_id}/recipes', 'POST /<id>/recipes',
+                                      data={'res_next': 'Next >>>'}))
+        pages.append(self.request('POST', f'/{self.user_id}/recipes', 'POST /<id>/recipes',
+                                  data={'res_back': '<<< Back'}))
+
+        ids = [id for res in pages if res is not None for id in RECIPE_LINK.findall(res.text)]
+        for recipe_id in random.sample(ids, min(2, len(ids))):
+            self.request('GET', f'/recipes/{recipe_id}', 'GET /recipes/<id>')
+
+        if ids:
+            recipe_id = random.choice(ids)
+            self.request('POST', user_path, 'POST /users/<id>', data={'rec_to_save': recipe_id})
+            self.request('GET', f'{user_path}/favorites', 'GET /users/<id>/favorites')
+            self.request('POST', f'{user_path}/favorites', 'POST /users/<id>/favorites',
+                         data={'rec_to_delete': recipe_id})
+
+    def run(self, iterations):
+        self.request('GET', '/', 'GET /')
+        self.register()
+        self.sign_in()
+        if self.user_id is None:
+            return
+        for _ in range(iterations):
+            self.browse()
+
+
+def route_of(location):
+    """Route pattern for a redirect target, e.g. /users/12 -> /users/<id>."""
+
+    path = re.sub(r'^https?://[^/]+', '', location).split('?')[0]
+    path = re.sub(r'/\d+', '/<id>', path)
+    return path if path.startswith('/') else '/' + path
+
+
+def print_report(report):
+    print(f"{'route':32} {'reqs':>6} {'errs':>5} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in report['routes']:
+        print(f"{row['route']:32} {row['requests']:>6} {row['errors']:>5} {row['rps']:>7.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}")
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f}s, {report['rps']:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--iterations', type=int, default=3,
+                        help='browsing rounds per user after signing in')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0, help='for repeatable journeys')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    recorder = Recorder()
+    users = [VirtualUser(args.base_url, recorder, args.timeout) for _ in range(args.users)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        for future in [pool.submit(user.run, args.iterations) for user in users]:
+            future.result()
+    report = recorder.report(time.perf_counter() - start)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
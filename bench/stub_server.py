@@ -0,0 +1,139 @@
+"""Local stand-in for the Spoonacular API, for benchmarks and load tests.
+
+Answers complexSearch and /recipes/{id}/information with generated but
+stable data (the same id always gives the same recipe), after a
+configurable delay and with a configurable share of errors. Point the
+app at it with SPOONACULAR_URL:
+
+    python bench/stub_server.py --port 8081 --latency-ms 150 --error-rate 0.01
+    SPOONACULAR_URL=http://127.0.0.1:8081 SPOONACULAR_API_KEY=bench gunicorn app:app
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+TOTAL_RESULTS = 900
+DISHES = ['Pasta', 'Tacos', 'Soup', 'Salad', 'Curry', 'Risotto', 'Stew', 'Pancakes']
+ADJECTIVES = ['Quick', 'Creamy', 'Spicy', 'Smoky', 'Lemony', 'Rustic', 'Crispy', 'Herby']
+INGREDIENTS = ['garlic', 'onion', 'tomato', 'olive oil', 'basil', 'chicken', 'rice',
+               'spinach', 'chickpeas', 'butter', 'lemon', 'parmesan']
+DIETS = ['gluten free', 'dairy free', 'vegetarian', 'vegan', 'paleo']
+CUISINES = ['Italian', 'Mexican', 'Thai', 'Greek', 'Indian', 'French']
+
+INFORMATION = re.compile(r'^/recipes/(\d+)/information$')
+
+
+def title_of(recipe_id):
+    rnd = random.Random(recipe_id)
+    return f'{rnd.choice(ADJECTIVES)} {rnd.choice(DISHES)} #{recipe_id}'
+
+
+def image_of(recipe_id):
+    return f'https://spoonacular.com/recipeImages/{recipe_id}-312x231.jpg'
+
+
+def search(params):
+    number = int(params.get('number', 10))
+    offset = int(params.get('offset', 0))
+    # different queries page through different ids
+    query = sorted((k, v) for k, v in params.items() if k not in ('number', 'offset'))
+    base = 100000 + zlib.crc32(repr(query).encode()) % 1000 * 1000
+    ids = range(base + offset, base + min(offset + number, TOTAL_RESULTS))
+    return {'results': [{'id': id, 'title': title_of(id), 'image': image_of(id),
+                         'imageType': 'jpg'} for id in ids],
+            'offset': offset,
+            'number': number,
+            'totalResults': TOTAL_RESULTS}
+
+
+def information(recipe_id):
+    rnd = random.Random(recipe_id)
+    ingredients = rnd.sample(INGREDIENTS, 6)
+    return {
+        'id': recipe_id,
+        'title': title_of(recipe_id),
+        'image': image_of(recipe_id),
+        'healthScore': rnd.randint(1, 100),
+        'readyInMinutes': rnd.choice([15, 30, 45, 60]),
+        'servings': rnd.randint(1, 6),
+        'diets': rnd.sample(DIETS, 2),
+        'cuisines': rnd.sample(CUISINES, 1),
+        'summary': (f'<b>{title_of(recipe_id)}</b> is a main course. '
+                    f'It serves <b>{rnd.randint(1, 6)}</b>. '
+                    f'Try <a href="https://spoonacular.com/recipes/x-{recipe_id + 1}">this one</a> too.'),
+        'instructions': '<ol>' + ''.join(f'<li>Add the {name}.</li>' for name in ingredients) + '</ol>',
+        'extendedIngredients': [{'name': name, 'amount': rnd.choice([0.25, 1, 2, 200]),
+                                 'unit': rnd.choice(['cup', 'g', 'tbsp', ''])}
+                                for name in ingredients],
+        'nutrition': {'nutrients': [{'name': 'Calories', 'amount': rnd.randint(150, 900),
+                                     'unit': 'kcal'}]},
+        'winePairing': {'pairingText': 'A crisp white wine goes well with it.'},
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.1
+    jitter = 0.05
+    error_rate = 0.0
+    quota = 1000000.0
+
+    def do_GET(self):
+        cls = type(self)
+        time.sleep(max(0, cls.latency + random.uniform(-cls.jitter, cls.jitter)))
+
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        match = INFORMATION.match(url.path)
+        if random.random() < cls.error_rate:
+            return self.reply(500, {'status': 'failure', 'message': 'stub error'})
+        if url.path == '/recipes/complexSearch':
+            return self.reply(200, search(params))
+        if match:
+            return self.reply(200, information(int(match.group(1))))
+        return self.reply(404, {'status': 'failure', 'message': 'not found'})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-API-Quota-Left', str(type(self).quota))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=100,
+                        help='average response delay')
+    parser.add_argument('--jitter-ms', type=float, default=50,
+                        help='delay varies by up to this much either way')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of requests answered with a 500 (0 to 1)')
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    StubHandler.jitter = args.jitter_ms / 1000
+    StubHandler.error_rate = args.error_rate
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f'Spoonacular stub on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
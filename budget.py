@@ -0,0 +1,154 @@
+"""Client-side budget for Spoonacular API points.
+
+Spoonacular bills each call in points against a daily quota. A token
+bucket holding up to a day's worth of points, refilled continuously, is
+kept in the `api_budget` table so every worker draws from the same
+budget. Interactive requests may use all of it; background work
+(prefetch, cache refresh, feed builds) stops once only the reserve is left.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock, local
+from urllib.parse import parse_qsl
+
+from flask import has_app_context
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, ApiBudget
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_state = local()
+
+
+def current_priority():
+    return getattr(_state, 'priority', INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """Run the block with upstream calls billed at `level` priority."""
+
+    previous = current_priority()
+    _state.priority = level
+    try:
+        yield
+    finally:
+        _state.priority = previous
+
+
+def estimate_points(path, params=''):
+    """Points Spoonacular charges for a call.
+
+    complexSearch costs 1 point plus 0.01 per requested result, other
+    endpoints 1 point.
+    """
+
+    if path.endswith('/complexSearch'):
+        number = dict(parse_qsl(params.lstrip('&'))).get('number', '10')
+        try:
+            return 1 + 0.01 * int(number)
+        except ValueError:
+            return 1
+    return 1
+
+
+class Budget:
+    """Token bucket of API points shared through Postgres."""
+
+    def __init__(self, daily_points, reserve=0.3, name='spoonacular'):
+        self.capacity = daily_points
+        self.rate = daily_points / (24 * 60 * 60)
+        self.reserve = reserve
+        self.name = name
+        self.remaining = daily_points
+        self.denied = 0
+        # used when the database isn't reachable
+        self._local_tokens = daily_points
+        self._local_updated = time.time()
+        self._lock = Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(daily_points=float(os.environ.get('SPOONACULAR_DAILY_POINTS', 150)),
+                   reserve=float(os.environ.get('SPOONACULAR_BUDGET_RESERVE', 0.3)))
+
+    def take(self, points, level=None):
+        """Take `points` from the budget; False if the request must not be made."""
+
+        level = level or current_priority()
+        floor = 0 if level == INTERACTIVE else self.capacity * self.reserve
+        allowed = self._update(lambda tokens: tokens - points if tokens - points >= floor else None)
+        if not allowed:
+            self.denied += 1
+        return allowed
+
+    def refund(self, points):
+        """Give back points taken for a call that wasn't made."""
+
+        self._update(lambda tokens: tokens + points)
+
+    def observe_quota(self, quota_left):
+        """Don't believe we have more points than Spoonacular says are left."""
+
+        self._update(lambda tokens: min(tokens, quota_left))
+
+    def is_low(self):
+        """True once only the reserve for interactive requests is left."""
+
+        return self.remaining < self.capacity * self.reserve
+
+    def shrink(self, number, minimum):
+        """Ask for fewer results when the budget runs low."""
+
+        return max(minimum, number // 4) if self.is_low() else number
+
+    def _refill(self, tokens, elapsed):
+        return min(self.capacity, tokens + elapsed * self.rate)
+
+    def _update(self, change):
+        """Apply `change(tokens)` to the bucket; it returns None to refuse."""
+
+        if has_app_context():
+            try:
+                return self._update_shared(change)
+            except SQLAlchemyError:
+                pass
+        return self._update_local(change)
+
+    def _update_local(self, change):
+        with self._lock:
+            now = time.time()
+            tokens = self._refill(self._local_tokens, now - self._local_updated)
+            new_tokens = change(tokens)
+            self._local_tokens = tokens if new_tokens is None else new_tokens
+            self._local_updated = now
+            self.remaining = self._local_tokens
+            return new_tokens is not None
+
+    def _update_shared(self, change):
+        table = ApiBudget.__table__
+        now = datetime.utcnow()
+        select = (db.select([table.c.tokens, table.c.updated_at])
+                  .where(table.c.name == self.name)
+                  .with_for_update())
+        with db.engine.begin() as conn:
+            row = conn.execute(select).first()
+            if row is None:
+                conn.execute(insert(table)
+                             .values(name=self.name, tokens=self.capacity, updated_at=now)
+                             .on_conflict_do_nothing(index_elements=['name']))
+                row = conn.execute(select).first()
+            tokens = self._refill(row.tokens, (now - row.updated_at).total_seconds())
+            new_tokens = change(tokens)
+            conn.execute(table.update()
+                         .where(table.c.name == self.name)
+                         .values(tokens=tokens if new_tokens is None else new_tokens,
+                                 updated_at=now))
+        self.remaining = tokens if new_tokens is None else new_tokens
+        return new_tokens is not None
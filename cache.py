@@ -0,0 +1,397 @@
+"""Two-tier response cache for Spoonacular requests.
+
+The first tier is an in-process LRU that keeps the most recent responses
+of a worker. The second tier is the `api_cache` table in Postgres, shared
+by every worker, so a response fetched by one process is reused by all.
+
+On a miss, concurrent callers for the same request are coalesced: within
+a worker they wait on one in-flight fetch (SingleFlight), and across
+workers a lease row in `cache_leases` lets one of them fetch while the
+others poll the shared tier for its result.
+
+No database connection is held during the upstream call: taking and
+releasing the lease, polling and the shared tier reads and writes each
+check a pooled connection out for a single statement. Together with the
+request's own db.session connection, and the API budget update
+(budget.py) which runs between them, a request needs at most two
+connections at once.
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from threading import Lock, RLock
+from urllib.parse import parse_qsl, urlencode
+
+from flask import has_app_context
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, ApiCache, CacheLease
+
+
+def normalize_params(params):
+    """Turn a Spoonacular query string into a stable cache key.
+
+    '&diet=vegan&number=4' and 'number=4&diet=vegan ' give the same key.
+    """
+
+    pairs = parse_qsl(params.strip().lstrip('&'), keep_blank_values=True)
+    pairs = sorted((key.strip(), value.strip()) for key, value in pairs
+                   if key.strip() != 'apiKey')
+    return urlencode(pairs)
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+        """Return cached value for `key` or None if missing/expired."""
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        """Store `value` for `ttl` seconds, evicting least recently used."""
+
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one call."""
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = Lock()
+
+    def do(self, key, fn):
+        """Call `fn()`, or wait for the call already running for `key`."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            call.set_result(fn())
+        except Exception as exc:
+            call.set_exception(exc)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return call.result()
+
+
+class ResponseCache:
+    """LRU in front of the shared `api_cache` table with per-endpoint TTLs.
+
+    After its TTL a response turns stale but is kept for `stale_ttls` more
+    seconds. A stale response is returned at once while a fresh copy is
+    fetched in the background with `submit(fn)` (stale-while-revalidate),
+    so upstream slowness or outages don't reach the user. Jobs that exist
+    to refresh data pass `allow_stale=False` to get a fresh copy instead.
+    """
+
+    # how often (in writes) expired rows are removed from the shared store
+    PRUNE_EVERY = 200
+    # seconds another worker's fetch is waited for before fetching anyway
+    LEASE_SECONDS = 15
+    # seconds between looks at the shared tier while waiting
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, ttls, stale_ttls=None, maxsize=512, max_rows=50000, submit=None):
+        self.ttls = ttls
+        self.stale_ttls = stale_ttls or {}
+        self.submit = submit
+        self.max_rows = max_rows
+        self.local = TTLCache(maxsize)
+        self.flights = SingleFlight()
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.stale_hits = 0
+        self._writes = 0
+        self._revalidating = set()
+        self._revalidating_lock = Lock()
+
+    def key(self, endpoint, params):
+        return f'{endpoint}?{normalize_params(params)}'
+
+    def lookup(self, endpoint, params):
+        """Return (value, is_fresh) from memory or Postgres, (None, False) if absent."""
+
+        key = self.key(endpoint, params)
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self._shared_get(key)
+        if entry is None:
+            return None, False
+
+        value, fresh_until = entry
+        return value, fresh_until > time.time()
+
+    def get(self, endpoint, params):
+        """Fresh cached response or None."""
+
+        value, fresh = self.lookup(endpoint, params)
+        return value if fresh else None
+
+    def set(self, endpoint, params, value):
+        key = self.key(endpoint, params)
+        ttl = self.ttls[endpoint]
+        stale_ttl = self.stale_ttls.get(endpoint, 0)
+        self.local.set(key, (value, time.time() + ttl), ttl + stale_ttl)
+        self._shared_set(key, endpoint, value, ttl, stale_ttl)
+
+    def fetch(self, endpoint, params, fetch_fn, allow_stale=True):
+        """Return cached response or call `fetch_fn()` and cache its result.
+
+        Stale responses are returned right away and refreshed in the
+        background, or with `allow_stale=False` treated as a miss.
+        Concurrent misses for the same request share a single
+        `fetch_fn()` call.
+        """
+
+        value, fresh = self.lookup(endpoint, params)
+        if value is None or (not fresh and not allow_stale):
+            return self._fetch_once(endpoint, params, fetch_fn)
+
+        if not fresh:
+            self.stale_hits += 1
+            self._revalidate(endpoint, params, fetch_fn)
+        return value
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        """Hit/miss counters for both tiers."""
+
+        return {
+            'local_hits': self.local.hits,
+            'local_misses': self.local.misses,
+            'local_size': len(self.local),
+            'shared_hits': self.shared_hits,
+            'shared_misses': self.shared_misses,
+            'stale_hits': self.stale_hits,
+            'coalesced': self.flights.coalesced,
+        }
+
+    def _fetch_once(self, endpoint, params, fetch_fn):
+        key = self.key(endpoint, params)
+
+        def fetch():
+            token = self._take_lease(key)
+            if token is None:
+                # another worker is fetching it
+                value = self._wait_for(key)
+                if value is not None:
+                    return value
+                token = self._take_lease(key)
+            try:
+                # another worker may have fetched it in the meantime
+                entry = self._shared_get(key)
+                if entry is not None and entry[1] > time.time():
+                    return entry[0]
+                value = fetch_fn()
+                self.set(endpoint, params, value)
+                return value
+            finally:
+                if token is not None:
+                    self._release_lease(key, token)
+
+        return self.flights.do(key, fetch)
+
+    def _revalidate(self, endpoint, params, fetch_fn):
+        """Refresh a stale entry in the background, once at a time per key."""
+
+        if self.submit is None:
+            return
+        key = self.key(endpoint, params)
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                self._fetch_once(endpoint, params, fetch_fn)
+            except Exception:
+                # keep serving the stale copy until it expires
+                pass
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+
+        self.submit(run)
+
+    # ---------------shared (Postgres) tier-----------
+    # The shared tier is best effort: without an app context, or if the
+    # database is unavailable, requests still work using the local tier only.
+
+    def _shared_get(self, key):
+        """Return (payload, fresh_until timestamp) from Postgres or None.
+
+        Found entries are also kept locally for as long as they're usable.
+        """
+
+        if not has_app_context():
+            return None
+        now = datetime.utcnow()
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    db.select([ApiCache.payload, ApiCache.fresh_until, ApiCache.expires_at])
+                    .where(ApiCache.key == key)
+                    .where(ApiCache.expires_at > now)
+                ).first()
+        except SQLAlchemyError:
+            return None
+
+        if row is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+
+        entry = (row.payload, time.time() + (row.fresh_until - now).total_seconds())
+        self.local.set(key, entry, (row.expires_at - now).total_seconds())
+        return entry
+
+    def _shared_set(self, key, endpoint, value, ttl, stale_ttl):
+        if not has_app_context():
+            return
+        fresh_until = datetime.utcnow() + timedelta(seconds=ttl)
+        stmt = insert(ApiCache.__table__).values(
+            key=key,
+            endpoint=endpoint,
+            payload=value,
+            fresh_until=fresh_until,
+            expires_at=fresh_until + timedelta(seconds=stale_ttl))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'payload': stmt.excluded.payload,
+                  'fresh_until': stmt.excluded.fresh_until,
+                  'expires_at': stmt.excluded.expires_at})
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+                self._writes += 1
+                if self._writes % self.PRUNE_EVERY == 0:
+                    self._prune(conn)
+        except SQLAlchemyError:
+            pass
+
+    def _take_lease(self, key):
+        """Lease `key` for fetching; None if another worker holds it.
+
+        Returns a token for _release_lease. Without an app context or a
+        database there's nobody to coordinate with, so the lease is
+        always granted.
+        """
+
+        token = uuid.uuid4().hex
+        if not has_app_context():
+            return token
+        table = CacheLease.__table__
+        now = datetime.utcnow()
+        stmt = insert(table).values(key=key, token=token,
+                                    expires_at=now + timedelta(seconds=self.LEASE_SECONDS))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'token': stmt.excluded.token, 'expires_at': stmt.excluded.expires_at},
+            # take over leases of workers that died mid-fetch
+            where=table.c.expires_at <= now)
+        try:
+            with db.engine.begin() as conn:
+                return token if conn.execute(stmt).rowcount else None
+        except SQLAlchemyError:
+            return token
+
+    def _release_lease(self, key, token):
+        if not has_app_context():
+            return
+        table = CacheLease.__table__
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete()
+                             .where(table.c.key == key)
+                             .where(table.c.token == token))
+        except SQLAlchemyError:
+            pass
+
+    def _wait_for(self, key):
+        """Fresh value stored by the lease holder, or None once it gave up."""
+
+        table = CacheLease.__table__
+        deadline = time.time() + self.LEASE_SECONDS
+        while time.time() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            try:
+                with db.engine.connect() as conn:
+                    held = conn.execute(
+                        db.select([table.c.key])
+                        .where(table.c.key == key)
+                        .where(table.c.expires_at > datetime.utcnow())
+                    ).first()
+            except SQLAlchemyError:
+                return None
+            if held is None:
+                break
+        entry = self._shared_get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        return None
+
+    def _prune(self, conn):
+        """Drop expired rows and keep the table under `max_rows`."""
+
+        table = ApiCache.__table__
+        conn.execute(table.delete().where(
+            table.c.expires_at <= datetime.utcnow()))
+        oldest_kept = (db.select([table.c.expires_at])
+                       .order_by(table.c.expires_at.desc())
+                       .offset(self.max_rows).limit(1).as_scalar())
+        conn.execute(table.delete().where(table.c.expires_at <= oldest_kept))
@@ -0,0 +1,122 @@
+"""Local recipe catalog.
+
+Full Spoonacular recipe details are kept in `recipes.details`, filled in
+the first time a recipe is opened or saved, and refreshed by the job
+worker once they are older than STALE_AFTER. The detail page renders
+from the database and keeps working while Spoonacular is down.
+Details are stored after ingest.prepare_recipe, ready to render.
+
+Details of the recipes a user is looking at, and of the next page of
+their results, are prefetched by the job worker so the click-through
+is a catalog hit.
+"""
+
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Recipe
+from helper import get_recipe, submit
+from jobs import job, enqueue
+from paging import get_page, PAGE_SIZE
+from spoonacular import client, SpoonacularError
+from search import search_fields
+from ingest import prepare_recipe
+
+STALE_AFTER = timedelta(days=7)
+# most recipe details fetched by one prefetch job: this page and the next
+PREFETCH_LIMIT = 2 * PAGE_SIZE
+
+
+def get_recipe_details(recipe_id):
+    """Return recipe details from the catalog, fetching them if missing."""
+
+    recipe = Recipe.query.options(db.undefer_group('catalog')).get(recipe_id)
+    if recipe and recipe.details:
+        if 'render' not in recipe.details:
+            # stored before ingest-time processing existed
+            return save_recipe(recipe.details)
+        if recipe.is_stale(STALE_AFTER):
+            schedule_refresh(recipe.id)
+        return recipe.details
+
+    # a stale cached copy beats waiting on upstream here
+    return refresh_recipe(recipe_id, allow_stale=True)
+
+
+@job('refresh_recipe')
+def refresh_recipe(recipe_id, allow_stale=False):
+    """Fetch recipe details from Spoonacular and store them.
+
+    Stored details are stamped as fetched now, so by default a stale
+    cached response isn't good enough.
+    """
+
+    return save_recipe(get_recipe(recipe_id, allow_stale=allow_stale))
+
+
+def save_recipe(details):
+    """Prepare and store a Spoonacular details payload, return what's stored."""
+
+    details = prepare_recipe(details)
+    values = dict(id=details['id'],
+                  title=details['title'],
+                  image=details.get('image'),
+                  details=details,
+                  fetched_at=datetime.utcnow(),
+                  **search_fields(details))
+    stmt = insert(Recipe.__table__).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['id'],
+        set_={key: stmt.excluded[key] for key in values if key != 'id'})
+    db.session.execute(stmt)
+    db.session.commit()
+    return details
+
+
+def schedule_refresh(recipe_id):
+    """Refresh stale details on the job worker."""
+
+    enqueue('refresh_recipe', recipe_id, key=f'refresh_recipe:{recipe_id}')
+
+
+def missing_details(recipe_ids):
+    """Those of `recipe_ids` that have no details in the catalog, in order."""
+
+    stored = {id for (id,) in (db.session.query(Recipe.id)
+                               .filter(Recipe.id.in_(recipe_ids))
+                               .filter(Recipe.details.isnot(None)))}
+    return [id for id in recipe_ids if id not in stored]
+
+
+def schedule_prefetch(query, index):
+    """Prefetch details for page `index` of `query` and the page after it."""
+
+    enqueue('prefetch_details', query, index, key=f'prefetch_details:{index}:{query}')
+
+
+@job('prefetch_details')
+def prefetch_details(query, index):
+    """Store details of recipes on page `index` of `query` and the next page.
+
+    Best effort: skipped when the API budget is down to the interactive
+    reserve, and recipes that fail to load are left for the detail view.
+    Fetches run concurrently on the shared pool (SPOONACULAR_CONCURRENCY).
+    """
+
+    if client.budget and client.budget.is_low():
+        return
+
+    recipes, total = get_page(query, index)
+    if index + PAGE_SIZE < total:
+        recipes += get_page(query, index + PAGE_SIZE)[0]
+
+    ids = missing_details([recipe['id'] for recipe in recipes])[:PREFETCH_LIMIT]
+    fetch = partial(get_recipe, allow_stale=False)
+    futures = [submit(fetch, id) for id in ids]
+    for future in futures:
+        try:
+            save_recipe(future.result())
+        except SpoonacularError:
+            continue
@@ -0,0 +1,81 @@
+"""Configuration profiles for create_app.
+
+The profile is picked with APP_CONFIG (development, testing or
+production). Without it, FLASK_ENV=development selects development and
+anything else production. Settings that come from the environment are
+read when the app is created, so tests can set DATABASE_URL first.
+
+SECRET_KEY signs the session ids. Development and testing fall back to
+a fixed key; production refuses to start without one.
+"""
+
+import os
+
+
+class Config:
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+    DEBUG_TOOLBAR = False
+    # /metrics is off unless METRICS_TOKEN is set
+    METRICS_REQUIRE_TOKEN = False
+    DEFAULT_DATABASE_URL = 'postgresql:///meals'
+    DEFAULT_SECRET_KEY = None
+
+    def __init__(self):
+        # Get DB_URI from environ variable (useful for production/testing) or,
+        # if not set there, use the profile's local db.
+        self.SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', self.DEFAULT_DATABASE_URL)
+        self.SECRET_KEY = os.environ.get('SECRET_KEY') or self.DEFAULT_SECRET_KEY
+        # log requests slower than this many ms (0: off), a SAMPLE fraction of them
+        self.SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+        self.SLOW_REQUEST_SAMPLE = float(os.environ.get('SLOW_REQUEST_SAMPLE', 1))
+        # if set, /metrics needs "Authorization: Bearer <token>"
+        self.METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+        # per app process; gunicorn.conf.py sizes these for web workers
+        # from DB_MAX_CONNECTIONS
+        self.SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_pre_ping': True,
+        }
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    DEFAULT_SECRET_KEY = "123"
+    DEBUG_TOOLBAR = True
+    DEBUG_TB_INTERCEPT_REDIRECTS = False
+
+
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    PRESERVE_CONTEXT_ON_EXCEPTION = False
+    DEFAULT_DATABASE_URL = 'postgresql:///food-test'
+    DEFAULT_SECRET_KEY = "123"
+
+
+class ProductionConfig(Config):
+    METRICS_REQUIRE_TOKEN = True
+
+    def __init__(self):
+        super().__init__()
+        if not self.SECRET_KEY:
+            raise RuntimeError('SECRET_KEY is not set; it is required in production '
+                               '(use APP_CONFIG=development for a local run)')
+
+
+PROFILES = {
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+    'production': ProductionConfig,
+}
+
+
+def get_config(name=None):
+    """Config object for profile `name`, by default the one from the environment."""
+
+    if name is None:
+        name = os.environ.get('APP_CONFIG') or (
+            'development' if os.environ.get('FLASK_ENV') == 'development' else 'production')
+    return PROFILES[name]()
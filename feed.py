@@ -0,0 +1,75 @@
+"""Precomputed "Recipes of the day" feed for the anonymous homepage.
+
+A few hundred popular recipes are fetched in one batch, cut into pages of
+FEED_PAGE_SIZE and stored in `feed_pages` keyed by offset. Every visitor
+at the same offset gets the same page, so the homepage is one cached
+lookup instead of an upstream call per visitor.
+"""
+
+from datetime import datetime, timedelta
+
+from cache import TTLCache
+from helper import get_recipes_many
+from jobs import job, enqueue
+from models import db, FeedPage
+
+FEED_SIZE = 320
+FEED_PAGE_SIZE = 8
+REFRESH_EVERY = timedelta(hours=6)
+# how long a worker keeps a feed page before looking in the database again
+LOCAL_TTL = 5 * 60
+
+_pages = TTLCache(maxsize=FEED_SIZE // FEED_PAGE_SIZE)
+
+
+@job('build_feed')
+def build_homepage_feed():
+    """Fetch popular recipes and replace the stored feed pages."""
+
+    searches = [(100, '&sort=popularity', f'&offset={offset}')
+                for offset in range(0, FEED_SIZE, 100)]
+    recipes = [recipe for results in get_recipes_many(searches, allow_stale=False)
+               for recipe in results][:FEED_SIZE]
+    if not recipes:
+        return 0
+
+    now = datetime.utcnow()
+    FeedPage.query.delete()
+    for offset in range(0, len(recipes), FEED_PAGE_SIZE):
+        db.session.add(FeedPage(offset=offset,
+                                recipes=recipes[offset:offset + FEED_PAGE_SIZE],
+                                built_at=now))
+    db.session.commit()
+    _pages.clear()
+    return len(recipes)
+
+
+def get_feed_page(offset):
+    """Return recipes of the feed page at `offset`, or None if there's no feed.
+
+    Offsets past the end wrap around to the start of the feed. Without a
+    feed, e.g. right after a deploy, one is built on the job worker.
+    """
+
+    recipes = _pages.get(offset)
+    if recipes is not None:
+        return recipes
+
+    count = FeedPage.query.count()
+    if not count:
+        schedule_rebuild()
+        return None
+    page = FeedPage.query.get(offset % (count * FEED_PAGE_SIZE))
+    if page is None:
+        return None
+
+    if page.built_at < datetime.utcnow() - REFRESH_EVERY:
+        schedule_rebuild()
+    _pages.set(offset, page.recipes, LOCAL_TTL)
+    return page.recipes
+
+
+def schedule_rebuild():
+    """Rebuild the feed on the job worker, queued once at a time."""
+
+    enqueue('build_feed', key='build_feed')
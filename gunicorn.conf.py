@@ -0,0 +1,55 @@
+"""gunicorn settings: `gunicorn -c gunicorn.conf.py app:app` (see Procfile).
+
+Most of a request's time is spent waiting on Spoonacular, so each
+worker process serves many requests at once instead of one:
+
+- `gthread` (default): GUNICORN_THREADS threads per worker. Everything
+  shared between requests (HTTP pool, caches, metrics) is thread-safe.
+- `gevent`: thousands of cooperative connections per worker. Needs
+  `pip install gevent psycogreen`; psycopg2 is patched to yield to other
+  requests while waiting on Postgres.
+
+Requests give their database connection back before waiting on
+Spoonacular (helper.release_db_connection), so they hold one only while
+running SQL, and threads or greenlets are sized for upstream waits, not
+for the database. The SQLAlchemy pool is sized on its own:
+DB_MAX_CONNECTIONS is split between the workers of the host, and each
+worker's request threads and its background fetch threads
+(helper.executor) share that pool, briefly waiting for a connection
+when all are busy. The defaults fit a stock Postgres
+(max_connections=100) with room left for the job worker, migrations
+and psql. For a bigger pool, put PgBouncer in front and raise
+DB_MAX_CONNECTIONS.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# threads give the I/O concurrency, one process per core is enough
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# passwords.py splits the cores between workers by this
+os.environ.setdefault('WEB_CONCURRENCY', str(workers))
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+# gevent: open connections per worker
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+# longer than a slow upstream call with retries
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# database connections for all web workers of this host together
+db_connections = int(os.environ.get('DB_MAX_CONNECTIONS', 60))
+
+concurrency = worker_connections if worker_class == 'gevent' else threads
+# read by the app when workers import it
+os.environ.setdefault('SPOONACULAR_POOL_MAXSIZE', str(min(concurrency, 100)))
+os.environ.setdefault('DB_POOL_SIZE', str(max(2, db_connections // workers)))
+os.environ.setdefault('DB_MAX_OVERFLOW', '0')
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
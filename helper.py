@@ -1,32 +1,149 @@
-import requests
-from key import api_key
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-def get_recipes(n, params='', offset=''):
-    res = requests.get(f'https://api.spoonacular.com/recipes/complexSearch?apiKey={api_key}&number={n}{params}{offset}')
-    j_recipes = res.json()
-    return j_recipes['results']
-    
+from flask import current_app, has_app_context
 
-def get_recipe(id):
-    res = requests.get(f'https://api.spoonacular.com/recipes/{id}/information?apiKey={api_key}')
-    j_recipe = res.json()
-    return j_recipe
+from budget import BACKGROUND, current_priority, priority
+from cache import ResponseCache
+from models import db
+from spoonacular import client
+
+# seconds a response stays fresh, per Spoonacular endpoint
+CACHE_TTLS = {
+    'search': 60 * 60,
+    'recipe': 24 * 60 * 60,
+}
+# seconds past that a stale response may still be served while refreshing
+STALE_TTLS = {
+    'search': 24 * 60 * 60,
+    'recipe': 7 * 24 * 60 * 60,
+}
+
+# upper bound on concurrent upstream fetches started from this process
+MAX_CONCURRENCY = int(os.environ.get('SPOONACULAR_CONCURRENCY', 8))
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+
+def submit(fn, *args, level=None):
+    """Run `fn(*args)` on the shared pool, inside the caller's app context.
+
+    Upstream calls made by `fn` are billed at `level` priority, by default
+    the caller's.
+    """
+
+    app = current_app._get_current_object() if has_app_context() else None
+    level = level or current_priority()
+
+    def run():
+        with priority(level):
+            if app is None:
+                return fn(*args)
+            with app.app_context():
+                return fn(*args)
+
+    return executor.submit(run)
+
+
+def submit_background(fn, *args):
+    """Submit work nobody is waiting for (prefetch, refresh)."""
+
+    return submit(fn, *args, level=BACKGROUND)
+
+
+response_cache = ResponseCache(CACHE_TTLS, STALE_TTLS, submit=submit_background)
+
+
+def release_db_connection():
+    """Give db.session's pooled connection back before waiting on Spoonacular.
+
+    Ends the read transaction views leave open, so a request only holds a
+    connection while it runs SQL; loaded objects are reloaded on next use.
+    A session with unsaved changes is left alone rather than committed.
+    """
+
+    if not has_app_context():
+        return
+    session = db.session()
+    if session.new or session.dirty or session.deleted:
+        return
+    session.commit()
+
+
+def search_recipes(n, params='', offset=0, allow_stale=True):
+    """Return the full complexSearch payload (results, offset, totalResults).
+
+    With `allow_stale=False` a stale cached payload is fetched again.
+    """
+
+    query = f'number={n}&offset={offset}{params}'
+
+    def fetch():
+        release_db_connection()
+        return client.get('/recipes/complexSearch', query)
+
+    return response_cache.fetch('search', query, fetch, allow_stale=allow_stale)
+
+
+def search_total(n, params='', offset=0):
+    """totalResults of a cached (even stale) search_recipes answer, or None."""
+
+    value, fresh = response_cache.lookup('search', f'number={n}&offset={offset}{params}')
+    return value['totalResults'] if value is not None else None
+
+
+def search_cached(n, params='', offset=0):
+    """True if search_recipes(n, params, offset) has a fresh cached answer."""
+
+    return response_cache.get('search', f'number={n}&offset={offset}{params}') is not None
+
+
+def get_recipes(n, params='', offset='', allow_stale=True):
+    # fewer results cost fewer points when the budget is running low
+    n = client.budget.shrink(n, minimum=8) if client.budget else n
+    query = f'number={n}{params}{offset}'
+
+    def fetch():
+        release_db_connection()
+        return client.get('/recipes/complexSearch', query)
+
+    return response_cache.fetch('search', query, fetch, allow_stale=allow_stale)['results']
+
+
+def get_recipe(id, allow_stale=True):
+    # nutrition is needed for calorie search over the local catalog
+    params = 'includeNutrition=true'
+
+    def fetch():
+        release_db_connection()
+        return client.get(f'/recipes/{id}/information', params)
+
+    return response_cache.fetch('recipe', f'id={id}&{params}', fetch, allow_stale=allow_stale)
+
+def get_recipes_many(searches, allow_stale=True):
+    """Run several searches concurrently.
+
+    `searches` is a list of (n, params, offset) tuples as taken by
+    get_recipes. Returns result lists in the same order.
+    """
+
+    fetch = partial(get_recipes, allow_stale=allow_stale)
+    futures = [submit(fetch, *search) for search in searches]
+    return [future.result() for future in futures]
+
+
+def get_recipe_many(ids):
+    """Fetch details for several recipes concurrently, in order of `ids`."""
+
+    futures = [submit(get_recipe, id) for id in ids]
+    return [future.result() for future in futures]
 
 def convert_to_list(str):
     lst = str.replace('{', '').replace('}', '').replace('"', '').split(',')
     return lst
 
 def get_query_string(user):
-    query = ''
-    # ingredients to exclude
-    if user.excludeIngredients:
-        exclude = user.excludeIngredients.replace(' ', '')
-        query = f'&excludeIngredients={exclude}' 
-    
-    user_dict = user.__dict__
-    for key,value in user_dict.items():
-        if value and key in ['intolerances', 'cuisine', 'diet']:
-            for val in convert_to_list(value):
-                if val:
-                    query += f'&{key}={val}' 
-    return query
\ No newline at end of file
+    """Spoonacular filters for user's preferences, compiled on settings save."""
+
+    if user.search_filters is None:
+        return user.build_query_string()
+    return user.search_filters
@@ -0,0 +1,106 @@
+"""Ingest-time processing of Spoonacular recipe details.
+
+Upstream summaries and instructions are HTML with links back to
+Spoonacular. prepare_recipe runs once when a recipe enters the catalog
+and stores a render-ready copy under details['render']:
+
+- 'summary': sanitized sentences, without the ones linking to other recipes
+- 'instructions': sanitized instructions HTML
+- 'ingredients': name, display amount and unit for each ingredient
+
+recipe_body.html only prints these, and only sanitized markup is marked safe.
+"""
+
+from html import escape
+from html.parser import HTMLParser
+
+ALLOWED_TAGS = {'b', 'strong', 'i', 'em', 'p', 'br', 'ol', 'ul', 'li'}
+# tags dropped together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object'}
+VOID_TAGS = {'br'}
+
+
+class Sanitizer(HTMLParser):
+    """Keep whitelisted tags without attributes, escape all text."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+        elif tag in ALLOWED_TAGS and not self.dropping:
+            self.out.append(f'<{tag}>')
+            if tag not in VOID_TAGS:
+                self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+        elif tag in self.open_tags and not self.dropping:
+            # close anything left open inside this tag too
+            while self.open_tags:
+                open_tag = self.open_tags.pop()
+                self.out.append(f'</{open_tag}>')
+                if open_tag == tag:
+                    break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        closing = [f'</{tag}>' for tag in reversed(self.open_tags)]
+        return ''.join(self.out + closing)
+
+
+def sanitize_html(html):
+    """Strip everything but basic formatting from upstream HTML."""
+
+    sanitizer = Sanitizer()
+    sanitizer.feed(html or '')
+    return sanitizer.result()
+
+
+def summary_sentences(summary):
+    """Sanitized summary sentences, minus the ones advertising Spoonacular."""
+
+    sentences = []
+    for fact in (summary or '').split('. '):
+        if 'a href' in fact or 'spoonacular' in fact.lower():
+            continue
+        fact = sanitize_html(fact).strip()
+        if fact:
+            sentences.append(fact.rstrip('.') + '.')
+    return sentences
+
+
+def display_amount(amount):
+    """2.0 -> '2', 0.25 -> '0.2'."""
+
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        return ''
+    if int(amount) != 0:
+        return str(int(amount))
+    return str(round(amount, 1))
+
+
+def prepare_recipe(details):
+    """Return copy of `details` with a render-ready 'render' section."""
+
+    ingredients = [{'name': ing.get('name') or '',
+                    'amount': display_amount(ing.get('amount')),
+                    'unit': ing.get('unit') or ''}
+                   for ing in details.get('extendedIngredients') or []]
+
+    return dict(details, render={
+        'summary': summary_sentences(details.get('summary')),
+        'instructions': sanitize_html(details.get('instructions')),
+        'ingredients': ingredients,
+    })
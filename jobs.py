@@ -0,0 +1,114 @@
+"""Postgres-backed background job queue.
+
+Jobs are rows in the `jobs` table, run by worker.py outside the web
+process. A worker claims one due job with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of workers share the queue without running a job
+twice. The row stays locked while the job runs and is deleted in the
+same transaction when it succeeds; if the worker dies, the transaction
+rolls back and the job is picked up again. Failed jobs are retried with
+backoff until MAX_ATTEMPTS and then kept with their last error, but
+without their key, so the same work can be queued again. A job refused
+by the API budget or an open circuit didn't fail: it is put back for
+later without using up an attempt.
+
+Handlers are registered with @job(name) in the module doing the work.
+Jobs run at background priority for the API budget (see budget.py).
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from flask import has_app_context
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from budget import BACKGROUND, priority
+from models import db, Job
+from spoonacular import SpoonacularUnavailable
+
+MAX_ATTEMPTS = 5
+# seconds before the first retry, doubled on every further attempt
+RETRY_BACKOFF = 30
+# seconds to wait when upstream refused the job (budget or circuit)
+DEFER_DELAY = 60
+
+HANDLERS = {}
+
+log = logging.getLogger(__name__)
+
+
+def job(name):
+    """Register the decorated function as handler of jobs called `name`."""
+
+    def register(fn):
+        HANDLERS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, *args, key=None, delay=0):
+    """Queue `name(*args)` to run in `delay` seconds.
+
+    A job with the same `key` that is still queued makes this a no-op;
+    jobs that used up their attempts no longer hold their key.
+    Returns True if the job was queued. Queueing is best effort: without
+    an app context or a database it does nothing.
+    """
+
+    if not has_app_context():
+        return False
+    stmt = (insert(Job.__table__)
+            .values(name=name,
+                    args=list(args),
+                    key=key,
+                    run_at=datetime.utcnow() + timedelta(seconds=delay),
+                    attempts=0)
+            .on_conflict_do_nothing(index_elements=['key']))
+    try:
+        with db.engine.begin() as conn:
+            return conn.execute(stmt).rowcount > 0
+    except SQLAlchemyError:
+        log.exception('Could not queue job %s', name)
+        return False
+
+
+def run_next():
+    """Run the next due job; False if there was nothing to run."""
+
+    table = Job.__table__
+    now = datetime.utcnow()
+    claim = (db.select([table])
+             .where(table.c.run_at <= now)
+             .where(table.c.attempts < MAX_ATTEMPTS)
+             .order_by(table.c.run_at)
+             .limit(1)
+             .with_for_update(skip_locked=True))
+
+    with db.engine.begin() as conn:
+        row = conn.execute(claim).first()
+        if row is None:
+            return False
+        try:
+            with priority(BACKGROUND):
+                HANDLERS[row.name](*row.args)
+        except SpoonacularUnavailable as exc:
+            db.session.rollback()
+            log.info('Job %s%r deferred: %s', row.name, tuple(row.args), exc)
+            conn.execute(table.update()
+                         .where(table.c.id == row.id)
+                         .values(last_error=repr(exc),
+                                 run_at=now + timedelta(seconds=DEFER_DELAY)))
+        except Exception as exc:
+            db.session.rollback()
+            attempts = row.attempts + 1
+            log.exception('Job %s%r failed (attempt %d)', row.name, tuple(row.args), attempts)
+            values = dict(attempts=attempts,
+                          last_error=repr(exc),
+                          run_at=now + timedelta(seconds=RETRY_BACKOFF * 2 ** (attempts - 1)))
+            if attempts >= MAX_ATTEMPTS:
+                # dead: keep the row for its error, free the key for new jobs
+                values['key'] = None
+            conn.execute(table.update().where(table.c.id == row.id).values(**values))
+        else:
+            conn.execute(table.delete().where(table.c.id == row.id))
+    return True
@@ -0,0 +1,244 @@
+"""Per-request performance metrics.
+
+Every request is timed per route and split into phases: time spent on
+upstream calls (`timed('upstream')` in spoonacular.py), in SQL
+statements (SQLAlchemy cursor events) and rendering templates (Flask's
+template signals). Totals go into histograms served in Prometheus text
+format at /metrics. Numbers are per process, so each gunicorn worker
+reports its own.
+
+Requests slower than SLOW_REQUEST_MS are logged with their phase
+breakdown; SLOW_REQUEST_SAMPLE logs only that fraction of them.
+
+/metrics needs METRICS_TOKEN as a bearer token when one is set. With
+METRICS_REQUIRE_TOKEN (the production profile) and no token, it is
+switched off.
+"""
+
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import (Response, abort, before_render_template, current_app, g,
+                   has_request_context, request, template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+PHASES = ('upstream', 'db', 'render')
+
+
+class Histogram:
+    """Cumulative histogram per label values, Prometheus style."""
+
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total, count)
+                      for labels, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = format_labels(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = format_labels(list(zip(self.labels, label_values)) + [('le', bound)])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            inf = format_labels(list(zip(self.labels, label_values)) + [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{inf} {count}')
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def format_labels(pairs):
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    inner = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in pairs)
+    return '{' + inner + '}'
+
+
+request_seconds = Histogram('http_request_duration_seconds',
+                            'Request duration by route.',
+                            ('endpoint', 'method', 'status'))
+phase_seconds = Histogram('http_request_phase_seconds',
+                          'Time spent per request in upstream calls, SQL and templates.',
+                          ('endpoint', 'phase'))
+request_queries = Histogram('http_request_db_queries',
+                            'SQL statements per request.',
+                            ('endpoint',), buckets=COUNT_BUCKETS)
+query_seconds = Histogram('db_query_duration_seconds',
+                          'SQL statement duration, in and out of requests.',
+                          ())
+upstream_seconds = Histogram('upstream_request_duration_seconds',
+                             'Spoonacular call duration by endpoint.',
+                             ('path',))
+
+HISTOGRAMS = [request_seconds, phase_seconds, request_queries, query_seconds, upstream_seconds]
+
+# prefix -> function returning {name: number}, see add_gauges()
+_gauges = {}
+
+
+def add_gauges(prefix, collect):
+    """Export the numbers in `collect()` as gauges named `prefix_<key>`."""
+
+    _gauges[prefix] = collect
+
+
+def add_phase(phase, seconds):
+    """Count `seconds` of `phase` towards the current request, if any."""
+
+    if has_request_context() and 'metrics_phases' in g:
+        g.metrics_phases[phase] = g.metrics_phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase, path=None):
+    """Time the block as `phase` of the current request.
+
+    Upstream calls also go into the per-endpoint histogram under `path`.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        add_phase(phase, elapsed)
+        if path is not None:
+            upstream_seconds.observe(elapsed, path)
+
+
+# ---------------SQLAlchemy and template hooks-----------
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_start'].pop()
+    query_seconds.observe(elapsed)
+    add_phase('db', elapsed)
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+
+
+def handle_error(context):
+    # the statement failed, after_cursor_execute won't run
+    starts = context.connection.info.get('metrics_start') if context.connection else None
+    if starts:
+        starts.pop()
+
+
+def render_started(app, template, context, **extra):
+    if has_request_context() and 'metrics_phases' in g:
+        g.metrics_render.append(time.perf_counter())
+
+
+def render_finished(app, template, context, **extra):
+    if has_request_context() and 'metrics_phases' in g and g.metrics_render:
+        start = g.metrics_render.pop()
+        # a template rendered inside another one is already counted there
+        if not g.metrics_render:
+            add_phase('render', time.perf_counter() - start)
+
+
+# ---------------request hooks-----------
+
+def start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_phases = {}
+    g.metrics_queries = 0
+    g.metrics_render = []
+
+
+def finish_request(response):
+    if 'metrics_start' not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_start
+    endpoint = request.endpoint or 'unmatched'
+
+    request_seconds.observe(elapsed, endpoint, request.method, response.status_code)
+    for phase in PHASES:
+        phase_seconds.observe(g.metrics_phases.get(phase, 0.0), endpoint, phase)
+    request_queries.observe(g.metrics_queries, endpoint)
+    log_if_slow(elapsed, endpoint, response.status_code)
+    return response
+
+
+def log_if_slow(elapsed, endpoint, status):
+    threshold = current_app.config.get('SLOW_REQUEST_MS')
+    if not threshold or elapsed * 1000 < threshold:
+        return
+    if random.random() >= current_app.config.get('SLOW_REQUEST_SAMPLE', 1.0):
+        return
+    phases = ' '.join(f'{phase}={g.metrics_phases.get(phase, 0.0) * 1000:.0f}ms'
+                      for phase in PHASES)
+    current_app.logger.warning('Slow request %s %s -> %s (%s) %.0fms: %s queries=%d',
+                               request.method, request.full_path.rstrip('?'), status,
+                               endpoint, elapsed * 1000, phases, g.metrics_queries)
+
+
+def metrics_view():
+    """Prometheus text exposition of this process' metrics."""
+
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token and current_app.config.get('METRICS_REQUIRE_TOKEN'):
+        abort(404)
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(404)
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    for prefix, collect in sorted(_gauges.items()):
+        for name, value in sorted(collect().items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f'# TYPE {prefix}_{name} gauge')
+                lines.append(f'{prefix}_{name} {value}')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+_listening = False
+
+
+def init_app(app):
+    """Install the request, SQL and template hooks and the /metrics route."""
+
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+        before_render_template.connect(render_started)
+        template_rendered.connect(render_finished)
+        _listening = True
+
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,59 @@
+"""Schema migrations, run with `flask migrate` before starting a new release.
+
+The app doesn't touch the schema on startup. `flask migrate` applies the
+SQL files in migrations/ that haven't been applied yet, in name order,
+each in its own transaction, and records them in `schema_migrations`.
+Afterwards it creates tables that are new in models.py. On an empty
+database it creates all tables from the models and records every
+migration file as applied.
+"""
+
+import os
+from datetime import datetime
+
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+schema_migrations = db.Table(
+    'schema_migrations', db.MetaData(),
+    db.Column('name', db.Text, primary_key=True),
+    db.Column('applied_at', db.DateTime, nullable=False))
+
+
+def migration_files():
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql'))
+
+
+def applied_migrations(conn):
+    return {name for (name,) in conn.execute(db.select([schema_migrations.c.name]))}
+
+
+def run_migrations(mark_applied=False):
+    """Bring the database schema up to date, return names of applied files.
+
+    With `mark_applied` pending files are only recorded, for databases
+    where they were already applied by hand.
+    """
+
+    engine = db.engine
+    schema_migrations.create(engine, checkfirst=True)
+    fresh = not engine.has_table('users')
+
+    with engine.connect() as conn:
+        pending = [name for name in migration_files()
+                   if name not in applied_migrations(conn)]
+
+    applied = []
+    for name in pending:
+        with engine.begin() as conn:
+            if not (fresh or mark_applied):
+                with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                    conn.execute(f.read())
+                applied.append(name)
+            conn.execute(schema_migrations.insert()
+                         .values(name=name, applied_at=datetime.utcnow()))
+
+    # tables new in models.py; on an empty database, all of them
+    db.create_all()
+    return applied
@@ -0,0 +1,12 @@
+-- Response cache shared by all workers and full recipe details in recipes.
+
+CREATE TABLE IF NOT EXISTS api_cache (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_api_cache_expires_at ON api_cache (expires_at);
+
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS details JSONB;
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS fetched_at TIMESTAMP;
@@ -0,0 +1,13 @@
+-- Columns and indexes for local recipe search (search.py).
+
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS ingredients TEXT[];
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS diets TEXT[];
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS cuisines TEXT[];
+ALTER TABLE recipes ADD COLUMN IF NOT EXISTS calories DOUBLE PRECISION;
+
+CREATE INDEX IF NOT EXISTS ix_recipes_search_vector ON recipes USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS ix_recipes_ingredients ON recipes USING gin (ingredients);
+CREATE INDEX IF NOT EXISTS ix_recipes_diets ON recipes USING gin (diets);
+CREATE INDEX IF NOT EXISTS ix_recipes_cuisines ON recipes USING gin (cuisines);
+CREATE INDEX IF NOT EXISTS ix_recipes_calories ON recipes (calories);
@@ -0,0 +1,6 @@
+-- Store user preferences as arrays and keep their compiled search filters.
+
+ALTER TABLE users ALTER COLUMN diet TYPE TEXT[] USING NULLIF(diet, '')::TEXT[];
+ALTER TABLE users ALTER COLUMN intolerances TYPE TEXT[] USING NULLIF(intolerances, '')::TEXT[];
+ALTER TABLE users ALTER COLUMN cuisine TYPE TEXT[] USING NULLIF(cuisine, '')::TEXT[];
+ALTER TABLE users ADD COLUMN IF NOT EXISTS search_filters TEXT;
@@ -0,0 +1,10 @@
+-- One favorites row per user and recipe, indexed on (user_id, recipe_id).
+
+DELETE FROM favorites a
+    USING favorites b
+    WHERE a.id > b.id
+      AND a.user_id = b.user_id
+      AND a.recipe_id = b.recipe_id;
+
+ALTER TABLE favorites
+    ADD CONSTRAINT uq_favorites_user_recipe UNIQUE (user_id, recipe_id);
@@ -0,0 +1,5 @@
+-- Keep stale responses around to serve while they're being refreshed.
+
+ALTER TABLE api_cache ADD COLUMN IF NOT EXISTS fresh_until TIMESTAMP;
+UPDATE api_cache SET fresh_until = expires_at WHERE fresh_until IS NULL;
+ALTER TABLE api_cache ALTER COLUMN fresh_until SET NOT NULL;
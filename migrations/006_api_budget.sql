@@ -0,0 +1,7 @@
+-- Shared token bucket of Spoonacular API points (see budget.py).
+
+CREATE TABLE IF NOT EXISTS api_budget (
+    name TEXT PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,10 @@
+-- Jobs that used up their attempts (jobs.MAX_ATTEMPTS) no longer block
+-- their key from being queued again.
+
+DO $$
+BEGIN
+    IF to_regclass('jobs') IS NOT NULL THEN
+        UPDATE jobs SET key = NULL WHERE attempts >= 5 AND key IS NOT NULL;
+    END IF;
+END
+$$;
@@ -0,0 +1,8 @@
+-- Cross-worker coalescing of cache misses without holding a connection
+-- during the upstream call (see cache.py).
+
+CREATE TABLE IF NOT EXISTS cache_leases (
+    key TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
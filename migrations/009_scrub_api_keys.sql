@@ -0,0 +1,12 @@
+-- Errors of jobs that failed before the API key moved into a header
+-- carried the key in the request URL.
+
+DO $$
+BEGIN
+    IF to_regclass('jobs') IS NOT NULL THEN
+        UPDATE jobs
+            SET last_error = regexp_replace(last_error, 'apiKey=[^&''" ]*', 'apiKey=[removed]', 'g')
+            WHERE position('apiKey=' in last_error) > 0;
+    END IF;
+END
+$$;
@@ -1,7 +1,9 @@
-from flask_bcrypt import Bcrypt
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR, insert
+
+from passwords import hasher
 
-bcrypt = Bcrypt()
 db = SQLAlchemy()
 
 def connect_db(app):
@@ -44,21 +46,27 @@ class User(db.Model):
     )
 
     diet = db.Column(
-        db.Text
+        ARRAY(db.Text)
     )
 
     intolerances = db.Column(
-        db.Text
+        ARRAY(db.Text)
     )
 
     cuisine = db.Column(
-        db.Text
+        ARRAY(db.Text)
     )
 
     excludeIngredients = db.Column(
         db.Text
     )
 
+    # Spoonacular filter string compiled from the preferences above,
+    # rebuilt by update_preferences
+    search_filters = db.Column(
+        db.Text
+    )
+
     favorites = db.relationship('Recipe', 
                                 secondary='favorites',
                                 backref='user')
@@ -66,11 +74,47 @@ class User(db.Model):
     def __repr__(self):
         return f"<User #{self.id}: {self.username}, {self.email}>"
 
+    PREFERENCES = ['diet', 'intolerances', 'cuisine']
+
+    @property
+    def prefs(self):
+        """Preferences that are set, as {'diet': [...], ...}."""
+
+        prefs = {}
+        for key in self.PREFERENCES:
+            values = [val for val in getattr(self, key) or [] if val]
+            if values:
+                prefs[key] = values
+        return prefs
+
+    def build_query_string(self):
+        """Compile preferences into Spoonacular complexSearch filters."""
+
+        query = ''
+        # ingredients to exclude
+        if self.excludeIngredients:
+            exclude = self.excludeIngredients.replace(' ', '')
+            query = f'&excludeIngredients={exclude}'
+
+        for key, values in self.prefs.items():
+            for val in values:
+                query += f'&{key}={val}'
+        return query
+
+    def update_preferences(self, diet, intolerances, cuisine, excludeIngredients):
+        """Set preferences and recompile the cached search filters."""
+
+        self.diet = diet
+        self.intolerances = intolerances
+        self.cuisine = cuisine
+        self.excludeIngredients = excludeIngredients
+        self.search_filters = self.build_query_string()
+
     @classmethod
     def register(cls, username, email, password):
         """Sign up user. Hashes password and adds user to system."""
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_pwd = hasher.hash(password)
         user = User(
             username=username,
             email=email,
@@ -86,12 +130,15 @@ class User(db.Model):
         It searches for a user whose password hash matches this password
         and, if it finds such a user, returns that user object.
         If can't find matching user (or if password is wrong), returns False.
+        Passwords hashed at another cost are rehashed; the caller commits.
         """
 
         user = cls.query.filter_by(username=username).first()
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = hasher.check(user.password, password)
             if is_auth:
+                if hasher.needs_rehash(user.password):
+                    user.password = hasher.hash(password)
                 return user
         return False
 
@@ -99,6 +146,13 @@ class Recipe(db.Model):
     """Recipes"""
 
     __tablename__='recipes'
+    __table_args__ = (
+        db.Index('ix_recipes_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_recipes_ingredients', 'ingredients', postgresql_using='gin'),
+        db.Index('ix_recipes_diets', 'diets', postgresql_using='gin'),
+        db.Index('ix_recipes_cuisines', 'cuisines', postgresql_using='gin'),
+        db.Index('ix_recipes_calories', 'calories'),
+    )
 
     id = db.Column(
         db.Integer,
@@ -114,12 +168,54 @@ class Recipe(db.Model):
         db.Text
     )
 
+    # full /information payload from Spoonacular, only loaded when asked
+    # for (undefer_group('catalog')) so recipe cards stay cheap to load
+    details = db.deferred(db.Column(
+        JSONB
+    ), group='catalog')
+
+    fetched_at = db.Column(
+        db.DateTime
+    )
+
+    # ---------------local search fields, filled from details (see search.py)-----------
+    search_vector = db.deferred(db.Column(
+        TSVECTOR
+    ), group='catalog')
+
+    ingredients = db.deferred(db.Column(
+        ARRAY(db.Text)
+    ), group='catalog')
+
+    diets = db.Column(
+        ARRAY(db.Text)
+    )
+
+    cuisines = db.Column(
+        ARRAY(db.Text)
+    )
+
+    calories = db.Column(
+        db.Float
+    )
+
     def __repr__(self):
         return f"<Recipe #{self.id}: {self.title}>"
 
+    def is_stale(self, max_age):
+        """True if details are missing or older than `max_age`."""
+
+        return (not self.details or not self.fetched_at
+                or self.fetched_at < datetime.utcnow() - max_age)
+
 class Favorites(db.Model):
+    """Recipes saved by users"""
 
     __tablename__='favorites'
+    __table_args__ = (
+        # one row per user and recipe, also serves user_id lookups
+        db.UniqueConstraint('user_id', 'recipe_id', name='uq_favorites_user_recipe'),
+    )
 
     id = db.Column(
         db.Integer,
@@ -135,4 +231,255 @@ class Favorites(db.Model):
     user_id = db.Column(
                 db.Integer,
                 db.ForeignKey('users.id')
-   )
\ No newline at end of file
+   )
+
+    PAGE_SIZE = 24
+
+    @classmethod
+    def add(cls, user_id, recipe_id):
+        """Save recipe to user's favorites, ignoring duplicates."""
+
+        stmt = insert(cls.__table__).values(user_id=user_id, recipe_id=recipe_id)
+        db.session.execute(stmt.on_conflict_do_nothing(
+            constraint='uq_favorites_user_recipe'))
+
+    @classmethod
+    def remove(cls, user_id, recipe_id):
+        """Remove recipe from this user's favorites only."""
+
+        cls.query.filter_by(user_id=user_id, recipe_id=recipe_id).delete()
+
+    @classmethod
+    def recipe_ids(cls, user_id):
+        """Set of recipe ids saved by the user."""
+
+        rows = db.session.query(cls.recipe_id).filter_by(user_id=user_id)
+        return {row.recipe_id for row in rows}
+
+    @classmethod
+    def page(cls, user_id, after=None, limit=PAGE_SIZE):
+        """Return (recipes, next_after) for one page of user's favorites.
+
+        Newest first. Pages are keyed on favorites.id, pass `next_after`
+        back as `after` to get the next page; it is None on the last page.
+        """
+
+        q = (db.session.query(cls.id.label('favorite_id'),
+                              Recipe.id, Recipe.title, Recipe.image)
+             .join(Recipe, Recipe.id == cls.recipe_id)
+             .filter(cls.user_id == user_id))
+        if after is not None:
+            q = q.filter(cls.id < after)
+        rows = q.order_by(cls.id.desc()).limit(limit + 1).all()
+
+        next_after = rows[limit - 1].favorite_id if len(rows) > limit else None
+        return rows[:limit], next_after
+
+class ApiCache(db.Model):
+    """Cached Spoonacular responses shared by all app workers."""
+
+    __tablename__ = 'api_cache'
+
+    key = db.Column(
+        db.Text,
+        primary_key=True
+    )
+
+    endpoint = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    payload = db.Column(
+        JSONB,
+        nullable=False
+    )
+
+    # served as is until fresh_until, then served stale while being
+    # refreshed, and dropped at expires_at
+    fresh_until = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    expires_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        index=True
+    )
+
+    def __repr__(self):
+        return f"<ApiCache {self.key} expires {self.expires_at}>"
+
+
+class CacheLease(db.Model):
+    """Worker currently fetching an `api_cache` key, see cache.py."""
+
+    __tablename__ = 'cache_leases'
+
+    key = db.Column(
+        db.Text,
+        primary_key=True
+    )
+
+    # identifies the holder, so only it releases the lease
+    token = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    # a lease whose holder died is taken over after this
+    expires_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<CacheLease {self.key} until {self.expires_at}>"
+
+
+class ApiBudget(db.Model):
+    """Shared token bucket of Spoonacular API points, see budget.py."""
+
+    __tablename__ = 'api_budget'
+
+    name = db.Column(
+        db.Text,
+        primary_key=True
+    )
+
+    tokens = db.Column(
+        db.Float,
+        nullable=False
+    )
+
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<ApiBudget {self.name}: {self.tokens} points>"
+
+
+class FeedPage(db.Model):
+    """One page of the anonymous homepage feed, see feed.py."""
+
+    __tablename__ = 'feed_pages'
+
+    offset = db.Column(
+        db.Integer,
+        primary_key=True,
+        autoincrement=False
+    )
+
+    recipes = db.Column(
+        JSONB,
+        nullable=False
+    )
+
+    built_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<FeedPage @{self.offset} built {self.built_at}>"
+
+
+class Recommendation(db.Model):
+    """Precomputed "Recommended for you" recipes of a user, see recommend.py."""
+
+    __tablename__ = 'recommendations'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True
+    )
+
+    # recipe cards (id, title, image), best first
+    recipes = db.Column(
+        JSONB,
+        nullable=False
+    )
+
+    built_at = db.Column(
+        db.DateTime,
+        nullable=False
+    )
+
+    def __repr__(self):
+        return f"<Recommendation for user #{self.user_id}: {len(self.recipes)} recipes>"
+
+
+class Job(db.Model):
+    """Queued background job, see jobs.py."""
+
+    __tablename__ = 'jobs'
+
+    id = db.Column(
+        db.BigInteger,
+        primary_key=True
+    )
+
+    name = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    args = db.Column(
+        JSONB,
+        nullable=False,
+        default=list
+    )
+
+    # jobs with the same key are only queued once; cleared when a job dies
+    key = db.Column(
+        db.Text,
+        unique=True
+    )
+
+    run_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        index=True
+    )
+
+    attempts = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0
+    )
+
+    last_error = db.Column(
+        db.Text
+    )
+
+    def __repr__(self):
+        return f"<Job #{self.id}: {self.name}{tuple(self.args)}>"
+
+
+class SessionData(db.Model):
+    """Server-side session data, see sessions.py."""
+
+    __tablename__ = 'sessions'
+
+    id = db.Column(
+        db.Text,
+        primary_key=True
+    )
+
+    data = db.Column(
+        db.Text,
+        nullable=False
+    )
+
+    expires_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        index=True
+    )
+
+    def __repr__(self):
+        return f"<SessionData {self.id} expires {self.expires_at}>"
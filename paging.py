@@ -0,0 +1,76 @@
+"""Server-side paging over Spoonacular search results.
+
+Instead of downloading 100 results to show 4 of them, results are fetched
+in chunks of CHUNK_SIZE using complexSearch's `offset`/`number`. Chunks
+are kept by the response cache, and the next chunk is prefetched by the
+job worker once the user pages close to the end of the current one.
+Queries the local catalog can answer (see search.py) never go upstream;
+the upstream total they are measured against comes from cached chunks.
+"""
+
+from helper import search_recipes, search_cached, search_total
+from jobs import job, enqueue
+from search import local_search
+
+CHUNK_SIZE = 20
+PAGE_SIZE = 4
+# start prefetching the next chunk when the page is this close to its end
+PREFETCH_MARGIN = 8
+# complexSearch does not page past this offset
+MAX_RESULTS = 1000
+
+
+def chunk_start(index):
+    return index - index % CHUNK_SIZE
+
+
+def upstream_total(query, start):
+    """Spoonacular's total for `query` from a cached chunk, None if unknown."""
+
+    total = search_total(CHUNK_SIZE, query, start)
+    if total is None and start:
+        total = search_total(CHUNK_SIZE, query, 0)
+    return min(total, MAX_RESULTS) if total is not None else None
+
+
+def get_page(query, index, size=PAGE_SIZE, allow_stale=True):
+    """Return (recipes, total) for results [index, index + size) of `query`.
+
+    With `allow_stale=False` stale cached chunks are fetched again.
+    """
+
+    start = chunk_start(index)
+    # a fresh cached chunk is cheaper than asking the catalog
+    if not search_cached(CHUNK_SIZE, query, start):
+        local = local_search(query, index, size, upstream_total(query, start))
+        if local is not None:
+            return local['results'], min(local['totalResults'], MAX_RESULTS)
+
+    chunk = search_recipes(CHUNK_SIZE, query, start, allow_stale=allow_stale)
+    total = min(chunk['totalResults'], MAX_RESULTS)
+    recipes = chunk['results'][index - start:index - start + size]
+
+    # the page crosses into the next chunk
+    next_start = start + CHUNK_SIZE
+    if len(recipes) < size and index + size > next_start and next_start < total:
+        next_chunk = search_recipes(CHUNK_SIZE, query, next_start, allow_stale=allow_stale)
+        recipes += next_chunk['results'][:size - len(recipes)]
+    elif index + size + PREFETCH_MARGIN > next_start and next_start < total:
+        prefetch_chunk(query, next_start)
+
+    return recipes, total
+
+
+@job('warm_page')
+def warm_page(query, index):
+    """Load a fresh copy of page `index` of `query` into the caches."""
+
+    get_page(query, index, allow_stale=False)
+
+
+def prefetch_chunk(query, start):
+    """Have the job worker fetch the chunk at `start` into the cache."""
+
+    if search_cached(CHUNK_SIZE, query, start):
+        return
+    enqueue('warm_page', query, start, key=f'warm_page:{start}:{query}')
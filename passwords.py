@@ -0,0 +1,113 @@
+"""Password hashing off the request thread.
+
+bcrypt is slow on purpose and releases the GIL while it works, so
+hashes are computed on a small thread pool: logins run in parallel
+across cores, and no more than `workers` hashes per process compete for
+CPU at once, however many requests are waiting. By default the cores
+are split between the app processes of the host (WEB_CONCURRENCY), so
+the host as a whole runs about one hash per core.
+
+The work factor comes from BCRYPT_LOG_ROUNDS. Hashes made with another
+cost still verify, and needs_rehash() tells when a password should be
+hashed again on the next successful login.
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import bcrypt
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(hashed, password):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed):
+    """Work factor a bcrypt hash was made with ('$2b$12$...' -> 12)."""
+
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def cooperative():
+    """True when running under gevent workers (see gunicorn.conf.py)."""
+
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def default_workers():
+    """This process's share of the host's cores.
+
+    Without WEB_CONCURRENCY, assume gunicorn.conf.py's default of one
+    app process per core.
+    """
+
+    cores = os.cpu_count() or 1
+    processes = int(os.environ.get('WEB_CONCURRENCY') or cores)
+    return max(1, cores // max(processes, 1))
+
+
+class PasswordHasher:
+    """bcrypt hashing on a bounded thread pool."""
+
+    def __init__(self, rounds=12, workers=None):
+        self.rounds = rounds
+        self.workers = workers or default_workers()
+        self._pool = None
+        self._lock = Lock()
+
+    @classmethod
+    def from_env(cls):
+        workers = os.environ.get('PASSWORD_HASH_WORKERS')
+        return cls(rounds=int(os.environ.get('BCRYPT_LOG_ROUNDS', 12)),
+                   workers=int(workers) if workers else None)
+
+    def hash(self, password):
+        """bcrypt hash of `password` at the configured cost."""
+
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, hashed, password):
+        """True if `password` matches `hashed`."""
+
+        try:
+            return self._run(_check, hashed, password)
+        except ValueError:
+            # not a bcrypt hash
+            return False
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def _run(self, fn, *args):
+        pool = self._get_pool()
+        if cooperative():
+            # waits without blocking the other greenlets of the worker
+            return pool.apply(fn, args)
+        return pool.submit(fn, *args).result()
+
+    def _get_pool(self):
+        # created on first use, so each forked app worker gets its own pool
+        with self._lock:
+            if self._pool is None:
+                if cooperative():
+                    # monkey-patched threads are greenlets and would run
+                    # bcrypt on the event loop; gevent's pool has real ones
+                    from gevent.threadpool import ThreadPool
+                    self._pool = ThreadPool(self.workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='bcrypt')
+            return self._pool
+
+
+hasher = PasswordHasher.from_env()
@@ -0,0 +1,157 @@
+""""Recommended for you" recipes, built from users' favorites.
+
+Every catalog recipe with details becomes a sparse feature vector of
+its ingredients, cuisines and diets (the columns search.py keeps),
+weighted by inverse document frequency and normalized. A user's taste
+profile is the normalized sum of their favorites' vectors, and
+candidates are ranked by cosine similarity to it, in batches of users
+with one sparse matrix product per batch.
+
+Lists are computed by the job worker and stored in `recommendations`,
+so the user page reads one row and never goes upstream for them.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy.dialects.postgresql import insert
+
+from jobs import job, enqueue
+from models import db, Favorites, Recipe, Recommendation
+
+RECOMMEND_SIZE = 12
+# users scored per matrix product; bounds the dense (users x recipes) block
+BATCH_SIZE = 64
+REFRESH_EVERY = timedelta(days=1)
+# favorites clicked in quick succession are folded into one rebuild
+REBUILD_DELAY = 30
+
+# a shared cuisine or diet says more about taste than one shared ingredient
+FEATURE_WEIGHTS = {
+    'ingredient': 1.0,
+    'cuisine': 2.0,
+    'diet': 1.5,
+}
+
+
+def feature_matrix(recipes):
+    """Rows of unit-length TF-IDF vectors for `recipes`.
+
+    `recipes` have `ingredients`, `cuisines` and `diets` lists.
+    """
+
+    vocabulary = {}
+    indptr, indices, data = [0], [], []
+    for recipe in recipes:
+        features = {}
+        for kind, values in (('ingredient', recipe.ingredients),
+                             ('cuisine', recipe.cuisines),
+                             ('diet', recipe.diets)):
+            for value in values or []:
+                column = vocabulary.setdefault(f'{kind}:{value.lower()}', len(vocabulary))
+                features[column] = FEATURE_WEIGHTS[kind]
+        indices.extend(features)
+        data.extend(features.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix((data, indices, indptr),
+                               shape=(len(recipes), len(vocabulary)), dtype=np.float64)
+    counts = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + matrix.shape[0]) / (1 + counts)) + 1
+    return normalize_rows(matrix @ sparse.diags(idf))
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def rank(features, favorites, limit=RECOMMEND_SIZE):
+    """Row indexes of the best recipes for each user, best first.
+
+    `favorites` holds one list of favorite row indexes per user. Their
+    own favorites and recipes sharing no feature are never recommended.
+    """
+
+    ranked = []
+    for start in range(0, len(favorites), BATCH_SIZE):
+        batch = favorites[start:start + BATCH_SIZE]
+        rows = [i for i, rows in enumerate(batch) for _ in rows]
+        columns = [column for rows in batch for column in rows]
+        liked = sparse.csr_matrix((np.ones(len(columns)), (rows, columns)),
+                                  shape=(len(batch), features.shape[0]))
+
+        profiles = normalize_rows(liked @ features)
+        scores = (profiles @ features.T).toarray()
+        scores[liked.nonzero()] = 0
+
+        k = min(limit, scores.shape[1])
+        if k == 0:
+            ranked += [[] for _ in batch]
+            continue
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for user_scores, candidates in zip(scores, top):
+            order = candidates[np.argsort(-user_scores[candidates], kind='stable')]
+            ranked.append([int(i) for i in order if user_scores[i] > 0])
+    return ranked
+
+
+@job('build_recommendations')
+def build_recommendations(user_ids=None):
+    """Recompute stored recommendations for `user_ids`, or for every user."""
+
+    recipes = (db.session.query(Recipe.id, Recipe.title, Recipe.image,
+                                Recipe.ingredients, Recipe.cuisines, Recipe.diets)
+               .filter(Recipe.details.isnot(None))
+               .order_by(Recipe.id)
+               .all())
+    row_of = {recipe.id: i for i, recipe in enumerate(recipes)}
+
+    favorites = db.session.query(Favorites.user_id, Favorites.recipe_id)
+    if user_ids is not None:
+        favorites = favorites.filter(Favorites.user_id.in_(user_ids))
+    liked = {}
+    for user_id, recipe_id in favorites:
+        if recipe_id in row_of:
+            liked.setdefault(user_id, []).append(row_of[recipe_id])
+
+    users = sorted(liked)
+    ranked = rank(feature_matrix(recipes), [liked[user_id] for user_id in users]) if users else []
+
+    now = datetime.utcnow()
+    for user_id, rows in zip(users, ranked):
+        cards = [{'id': recipes[i].id, 'title': recipes[i].title, 'image': recipes[i].image}
+                 for i in rows]
+        stmt = insert(Recommendation.__table__).values(user_id=user_id, recipes=cards,
+                                                       built_at=now)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'recipes': stmt.excluded.recipes, 'built_at': stmt.excluded.built_at}))
+
+    # users left without favorites get nothing
+    stale = Recommendation.query
+    if user_ids is not None:
+        stale = stale.filter(Recommendation.user_id.in_(user_ids))
+    stale.filter(Recommendation.user_id.notin_(users or [0])).delete(synchronize_session=False)
+    db.session.commit()
+    return len(users)
+
+
+def schedule_recommendations(user_id):
+    """Rebuild `user_id`'s recommendations on the job worker, soon."""
+
+    enqueue('build_recommendations', [user_id], key=f'build_recommendations:{user_id}',
+            delay=REBUILD_DELAY)
+
+
+def get_recommendations(user_id):
+    """Stored recommendations for `user_id`, as recipe cards."""
+
+    stored = Recommendation.query.get(user_id)
+    if stored is None:
+        return []
+    if stored.built_at < datetime.utcnow() - REFRESH_EVERY:
+        schedule_recommendations(user_id)
+    return stored.recipes
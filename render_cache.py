@@ -0,0 +1,87 @@
+"""Cache for rendered templates that don't change between views.
+
+Recipe detail bodies and anonymous homepage pages are rendered once per
+key and template version and kept as ready-made markup. Every cached
+render carries an ETag and Last-Modified, so browsers revalidating a
+page they already have get a 304 without any template work.
+"""
+
+import hashlib
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, render_template, request, make_response, session
+from markupsafe import Markup
+
+from cache import TTLCache
+
+Rendered = namedtuple('Rendered', ['body', 'etag', 'last_modified'])
+
+RENDER_TTL = 60 * 60
+
+_rendered = TTLCache(maxsize=1000)
+_template_version = None
+
+
+def template_version():
+    """Hash of all template files, so deploys with new templates miss the cache."""
+
+    global _template_version
+    if _template_version is None:
+        digest = hashlib.sha1()
+        root = os.path.join(current_app.root_path, current_app.template_folder)
+        for folder, dirs, files in sorted(os.walk(root)):
+            dirs.sort()
+            for name in sorted(files):
+                with open(os.path.join(folder, name), 'rb') as f:
+                    digest.update(name.encode())
+                    digest.update(f.read())
+        _template_version = digest.hexdigest()[:12]
+    return _template_version
+
+
+def render_cached(key, template, get_context, ttl=RENDER_TTL):
+    """Render `template` once per `key`.
+
+    `get_context()` is only called on a cache miss, so a hit skips both
+    the data lookup and Jinja.
+    """
+
+    cache_key = (key, template, template_version())
+    rendered = _rendered.get(cache_key)
+    if rendered is None:
+        body = Markup(render_template(template, **get_context()))
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        # HTTP dates have one second resolution
+        rendered = Rendered(body, etag, datetime.utcnow().replace(microsecond=0))
+        _rendered.set(cache_key, rendered, ttl)
+    return rendered
+
+
+def has_flashes():
+    """Pending flash messages make a page unique, it can't come from cache."""
+
+    return '_flashes' in session
+
+
+def cached_page(etag, last_modified, render):
+    """Response with validators set; 304 if the request's validators match.
+
+    `render()` builds the page body and is skipped when the browser
+    already has the version with `etag`.
+    """
+
+    body = '' if request.if_none_match.contains(etag) else render()
+    response = make_response(body)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def page_etag(*parts):
+    """ETag for a page made of a cached fragment plus per-user bits."""
+
+    return hashlib.sha1(':'.join(str(p) for p in parts).encode()).hexdigest()
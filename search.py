@@ -0,0 +1,229 @@
+"""Local recipe search over the cached catalog.
+
+Searches built by get_query_string and the search forms are answered
+from the `recipes` table whenever the catalog holds nearly as many
+matching recipes as Spoonacular reported for the same search (its
+totalResults, known once a chunk of it has been cached), saving the
+round trip to complexSearch. Searches without any filter are always
+left to Spoonacular, the catalog is only a sample of it.
+
+- `query` is matched against a weighted tsvector of title and instructions
+- `includeIngredients`/`excludeIngredients` use the GIN-indexed
+  `ingredients` array of normalized ingredient words
+- `diet` and `cuisine` use the GIN-indexed `diets`/`cuisines` arrays
+- `maxCalories` uses the `calories` index
+
+Filters that can't be answered reliably from local data (unknown diets,
+most intolerances) make local_search return None so the caller falls back
+to the upstream API.
+"""
+
+import re
+from urllib.parse import parse_qsl
+
+from sqlalchemy import func, literal_column
+
+from models import db, Recipe
+
+# share of upstream's totalResults the catalog must match to answer locally
+MIN_COVERAGE = 0.9
+
+# form diet name -> tag stored in Recipe.diets
+DIET_TAGS = {
+    'gluten free': 'gluten free',
+    'vegetarian': 'vegetarian',
+    'vegan': 'vegan',
+    'pescetarian': 'pescatarian',
+    'paleo': 'paleolithic',
+    'primal': 'primal',
+    'whole30': 'whole 30',
+}
+
+# intolerances that map onto a Spoonacular recipe flag, stored as a diet tag
+INTOLERANCE_TAGS = {
+    'dairy': 'dairy free',
+    'gluten': 'gluten free',
+}
+
+SUPPORTED_PARAMS = {'query', 'includeIngredients', 'excludeIngredients',
+                    'maxCalories', 'diet', 'cuisine', 'intolerances'}
+
+
+def normalize_word(word):
+    """Lowercase and crudely singularize: 'Tomatoes' -> 'tomato'."""
+
+    word = word.strip().lower()
+    if word.endswith('oes') or word.endswith('ches') or word.endswith('shes'):
+        return word[:-2]
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def ingredient_terms(name):
+    """Words and the full name of an ingredient, normalized for matching."""
+
+    words = [normalize_word(w) for w in re.findall(r'[a-zA-Z]+', name)]
+    terms = set(words)
+    if len(words) > 1:
+        terms.add(' '.join(words))
+    return terms
+
+
+def search_fields(details):
+    """Compute the search columns of a recipe from its details payload."""
+
+    ingredients = set()
+    for ing in details.get('extendedIngredients') or []:
+        ingredients |= ingredient_terms(ing.get('name') or '')
+
+    diets = {d.lower() for d in details.get('diets') or []}
+    if details.get('vegetarian'):
+        diets.add('vegetarian')
+    if details.get('vegan'):
+        diets.add('vegan')
+    if details.get('glutenFree'):
+        diets.add('gluten free')
+    if details.get('dairyFree'):
+        diets.add('dairy free')
+
+    calories = None
+    for nutrient in (details.get('nutrition') or {}).get('nutrients') or []:
+        if nutrient.get('name') == 'Calories':
+            calories = nutrient.get('amount')
+
+    text = re.sub(r'<[^>]+>', ' ', details.get('instructions') or '')
+    search_vector = func.setweight(
+        func.to_tsvector('english', details.get('title') or ''), 'A'
+    ).op('||')(func.setweight(func.to_tsvector('english', text), 'D'))
+
+    return {
+        'search_vector': search_vector,
+        'ingredients': sorted(ingredients),
+        'diets': sorted(diets),
+        'cuisines': sorted(c.lower() for c in details.get('cuisines') or []),
+        'calories': calories,
+    }
+
+
+def split_terms(value):
+    return [normalize_word(t) if ' ' not in t.strip()
+            else ' '.join(normalize_word(w) for w in t.split())
+            for t in value.split(',') if t.strip()]
+
+
+def build_query(params):
+    """Build a Recipe query for a Spoonacular query string.
+
+    Returns None if some filter can't be answered from local data.
+    """
+
+    pairs = parse_qsl(params.strip().lstrip('&'))
+    filters = [Recipe.details.isnot(None)]
+    diets, cuisines = [], []
+    rank = None
+
+    for key, value in pairs:
+        value = value.strip()
+        if key not in SUPPORTED_PARAMS:
+            return None
+        if not value:
+            continue
+
+        if key == 'query':
+            tsquery = func.plainto_tsquery('english', value)
+            filters.append(Recipe.search_vector.op('@@')(tsquery))
+            rank = func.ts_rank(Recipe.search_vector, tsquery)
+        elif key == 'includeIngredients':
+            filters.append(Recipe.ingredients.contains(split_terms(value)))
+        elif key == 'excludeIngredients':
+            filters.append(~Recipe.ingredients.overlap(split_terms(value)))
+        elif key == 'maxCalories':
+            try:
+                filters.append(Recipe.calories <= float(value))
+            except ValueError:
+                return None
+        elif key == 'diet':
+            tag = DIET_TAGS.get(value.lower())
+            if tag is None:
+                return None
+            diets.append(tag)
+        elif key == 'intolerances':
+            tag = INTOLERANCE_TAGS.get(value.lower())
+            if tag is None:
+                return None
+            diets.append(tag)
+        elif key == 'cuisine':
+            cuisines.append(value.lower())
+
+    if diets:
+        filters.append(Recipe.diets.contains(diets))
+    if cuisines:
+        # any of the chosen cuisines
+        filters.append(Recipe.cuisines.overlap(cuisines))
+
+    q = Recipe.query.filter(*filters)
+    if rank is not None:
+        return q.order_by(rank.desc(), Recipe.id)
+    return q.order_by(Recipe.id)
+
+
+def has_filters(params):
+    """True if the query string narrows the search at all."""
+
+    return any(value.strip() for _, value in parse_qsl(params.strip().lstrip('&')))
+
+
+def covers(local_total, upstream_total, min_coverage=MIN_COVERAGE):
+    """True if `local_total` matches are enough to stand in for upstream's."""
+
+    return local_total > 0 and local_total >= min_coverage * upstream_total
+
+
+def local_search(params, offset, number, upstream_total, min_coverage=MIN_COVERAGE):
+    """Answer a complexSearch request locally.
+
+    `upstream_total` is Spoonacular's totalResults for the same search,
+    None if unknown. Returns a payload shaped like complexSearch's, or
+    None if the search has no filters, the filters aren't supported, or
+    the catalog doesn't cover enough of upstream's results.
+    """
+
+    if upstream_total is None or not has_filters(params):
+        return None
+    q = build_query(params)
+    if q is None:
+        return None
+
+    rows = (q.with_entities(Recipe.id, Recipe.title, Recipe.image,
+                            literal_column('count(*) over ()').label('total'))
+            .offset(offset).limit(number).all())
+    if rows:
+        total = rows[0].total
+    else:
+        total = q.order_by(None).count() if offset else 0
+    if not covers(total, upstream_total, min_coverage):
+        return None
+
+    return {
+        'results': [{'id': r.id, 'title': r.title, 'image': r.image} for r in rows],
+        'offset': offset,
+        'number': number,
+        'totalResults': total,
+    }
+
+
+def reindex_catalog():
+    """Recompute search columns for every recipe with details."""
+
+    count = 0
+    recipes = (Recipe.query.options(db.undefer_group('catalog'))
+               .filter(Recipe.details.isnot(None)).all())
+    for recipe in recipes:
+        for key, value in search_fields(recipe.details).items():
+            setattr(recipe, key, value)
+        count += 1
+    db.session.commit()
+    return count
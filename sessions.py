@@ -0,0 +1,146 @@
+"""Server-side sessions stored in Postgres.
+
+The cookie carries only a signed, random session id. Session data lives
+in the `sessions` table, so request headers stay small, nothing is
+re-signed on every response, and a user's tabs share the same state no
+matter which worker serves them.
+"""
+
+import secrets
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from sqlalchemy.dialects.postgresql import insert
+from werkzeug.datastructures import CallbackDict
+
+from models import db, SessionData
+
+_missing = object()
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that tracks changes so unchanged sessions aren't saved.
+
+    Assigning the value a key already has isn't a change, so views can
+    keep writing e.g. session['total'] on every request for free.
+    """
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        # id this session had before regenerate(), its row is deleted on save
+        self.replaced_sid = None
+
+    def __setitem__(self, key, value):
+        current = self.get(key, _missing)
+        # the same list or dict may have been changed in place, save it then
+        mutated = current is value and isinstance(value, (list, dict, set))
+        if current == value and not mutated:
+            return
+        super().__setitem__(key, value)
+
+    def regenerate(self):
+        """Move the data to a new session id, e.g. when a user logs in.
+
+        A session id planted in the browser before login then doesn't
+        give access to the logged in session (session fixation).
+        """
+
+        if self.replaced_sid is None and not self.new:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class PostgresSessionInterface(SessionInterface):
+    """Keep session data in the `sessions` table, keyed by the cookie."""
+
+    serializer = TaggedJSONSerializer()
+    salt = 'server-session'
+    # how often (in saved sessions) expired rows are removed
+    PRUNE_EVERY = 500
+
+    def __init__(self):
+        self._saves = 0
+
+    def open_session(self, app, request):
+        # static files never touch the session, don't load it for them;
+        # the URL isn't matched yet here, so request.endpoint is still None
+        if app.static_url_path and request.path.startswith(app.static_url_path + '/'):
+            return ServerSession(new=True)
+
+        signer = Signer(app.secret_key, salt=self.salt)
+        cookie = request.cookies.get(app.session_cookie_name)
+        if cookie:
+            try:
+                sid = signer.unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                table = SessionData.__table__
+                with db.engine.connect() as conn:
+                    row = conn.execute(
+                        db.select([table.c.data])
+                        .where(table.c.id == sid)
+                        .where(table.c.expires_at > datetime.utcnow())
+                    ).first()
+                if row is not None:
+                    return ServerSession(self.serializer.loads(row.data), sid=sid)
+
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        table = SessionData.__table__
+
+        # Session rows are written on their own connection so this never
+        # commits whatever the view left in db.session.
+        stale_sids = [sid for sid in (session.sid, session.replaced_sid) if sid]
+
+        if not session:
+            if session.modified and stale_sids:
+                with db.engine.begin() as conn:
+                    conn.execute(table.delete().where(table.c.id.in_(stale_sids)))
+                response.delete_cookie(app.session_cookie_name,
+                                       domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        expires = self.get_expiration_time(app, session)
+        stmt = insert(table).values(
+            id=session.sid,
+            data=self.serializer.dumps(dict(session)),
+            expires_at=expires or datetime.utcnow() + app.permanent_session_lifetime)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['id'],
+            set_={'data': stmt.excluded.data,
+                  'expires_at': stmt.excluded.expires_at})
+        with db.engine.begin() as conn:
+            if session.replaced_sid:
+                conn.execute(table.delete().where(table.c.id == session.replaced_sid))
+            conn.execute(stmt)
+            self._saves += 1
+            if self._saves % self.PRUNE_EVERY == 0:
+                conn.execute(table.delete().where(
+                    table.c.expires_at <= datetime.utcnow()))
+
+        signer = Signer(app.secret_key, salt=self.salt)
+        response.set_cookie(app.session_cookie_name,
+                            signer.sign(session.sid).decode(),
+                            expires=expires,
+                            httponly=self.get_cookie_httponly(app),
+                            domain=domain,
+                            path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))
@@ -0,0 +1,285 @@
+"""Shared HTTP client for the Spoonacular API.
+
+All upstream calls go through one pooled keep-alive `requests.Session`
+with connect/read timeouts and short retries with backoff on 5xx. Settings
+come from the environment so a local stub server can stand in for
+Spoonacular (set SPOONACULAR_URL=http://localhost:PORT).
+
+A circuit breaker stops calling upstream for a cool-off window after
+repeated failures, a 429, or when the daily quota reported in the
+X-API-Quota-Left header runs out; calls fail fast in the meantime.
+Every call is also charged against the shared points budget (budget.py).
+
+The API key is sent in the x-api-key header, never in the URL, so it
+doesn't end up in exception messages, logs or `jobs.last_error`.
+"""
+
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from budget import Budget, estimate_points
+from metrics import timed
+
+
+class SpoonacularError(Exception):
+    """Upstream request failed (network error, timeout or bad status)."""
+
+
+class SpoonacularUnavailable(SpoonacularError):
+    """Circuit is open, upstream isn't being called right now."""
+
+
+class SpoonacularBudgetExceeded(SpoonacularUnavailable):
+    """Not enough API points left for a call at this priority."""
+
+
+class CircuitBreaker:
+    """Open after `threshold` failures in a row, for `cooloff` seconds.
+
+    Once the cool-off is over a single trial call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=5, cooloff=30):
+        self.threshold = threshold
+        self.cooloff = cooloff
+        self.failures = 0
+        self.open_until = 0
+        self.trips = 0
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def state(self):
+        if not self.open_until:
+            return 'closed'
+        return 'open' if time.time() < self.open_until else 'half-open'
+
+    def allow(self):
+        """True if a call may go upstream now."""
+
+        with self._lock:
+            if not self.open_until:
+                return True
+            if time.time() < self.open_until or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            # a successful trial call closes the circuit
+            if self._trial:
+                self.open_until = 0
+                self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._open(self.cooloff)
+
+    def trip(self, seconds):
+        """Open the circuit right away, e.g. on 429 or an exhausted quota."""
+
+        with self._lock:
+            self._open(seconds)
+
+    def _open(self, seconds):
+        self.open_until = max(self.open_until, time.time() + seconds)
+        self.trips += 1
+        self._trial = False
+
+
+def seconds_until_quota_reset():
+    """Spoonacular quotas reset at midnight UTC."""
+
+    now = datetime.utcnow()
+    midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return (midnight - now).total_seconds()
+
+
+def key_file_api_key():
+    """API key from key.py, only imported when the environment has none."""
+
+    try:
+        from key import api_key
+    except ImportError:
+        return ''
+    return api_key
+
+
+class SpoonacularClient:
+    """Pooled Spoonacular client with timeouts, retries and metrics."""
+
+    # not 429: a rate limit opens the circuit instead of being retried
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    def __init__(self, base_url, api_key, connect_timeout=3.05, read_timeout=10,
+                 pool_maxsize=10, retries=2, backoff=0.3, breaker=None, budget=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget
+        self.quota_left = None
+
+        retry = Retry(total=retries,
+                      connect=retries,
+                      read=retries,
+                      status=retries,
+                      backoff_factor=backoff,
+                      status_forcelist=self.RETRY_STATUSES,
+                      # urllib3 would sleep out any Retry-After in the
+                      # request thread; _check_limits trips the circuit
+                      respect_retry_after_header=False,
+                      raise_on_status=False)
+        self.adapter = HTTPAdapter(pool_connections=1,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=True,
+                                   max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers['x-api-key'] = api_key
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = Lock()
+        self._stats = {
+            'requests': 0,
+            'errors': 0,
+            'retries': 0,
+            'rejected': 0,
+            'in_flight': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(base_url=env.get('SPOONACULAR_URL', 'https://api.spoonacular.com'),
+                   api_key=env.get('SPOONACULAR_API_KEY') or key_file_api_key(),
+                   connect_timeout=float(env.get('SPOONACULAR_CONNECT_TIMEOUT', 3.05)),
+                   read_timeout=float(env.get('SPOONACULAR_READ_TIMEOUT', 10)),
+                   pool_maxsize=int(env.get('SPOONACULAR_POOL_MAXSIZE', 10)),
+                   retries=int(env.get('SPOONACULAR_RETRIES', 2)),
+                   backoff=float(env.get('SPOONACULAR_BACKOFF', 0.3)),
+                   breaker=CircuitBreaker(
+                       threshold=int(env.get('SPOONACULAR_BREAKER_THRESHOLD', 5)),
+                       cooloff=float(env.get('SPOONACULAR_BREAKER_COOLOFF', 30))),
+                   budget=Budget.from_env())
+
+    def get(self, path, params=''):
+        """GET `path` with query string `params`, return decoded JSON."""
+
+        points = estimate_points(path, params)
+        if self.budget and not self.budget.take(points):
+            self._count('rejected', 1)
+            raise SpoonacularBudgetExceeded(f'GET {path} skipped: out of API points')
+        if not self.breaker.allow():
+            if self.budget:
+                self.budget.refund(points)
+            self._count('rejected', 1)
+            raise SpoonacularUnavailable(f'GET {path} skipped: circuit open')
+
+        query = params.strip().lstrip('&')
+        url = f'{self.base_url}{path}?{query}' if query else f'{self.base_url}{path}'
+        self._count('in_flight', 1)
+        start = time.perf_counter()
+        try:
+            # one histogram for all /recipes/{id}/information calls
+            with timed('upstream', re.sub(r'/\d+', '/{id}', path)):
+                res = self.session.get(url, timeout=self.timeout)
+            self._count('retries', self._retries_of(res))
+            self._check_limits(res)
+            res.raise_for_status()
+            result = res.json()
+        except (requests.RequestException, ValueError) as exc:
+            self._count('errors', 1)
+            status = getattr(getattr(exc, 'response', None), 'status_code', None)
+            if status is None or status >= 500:
+                self.breaker.record_failure()
+            elif status != 429:
+                # upstream is up, the request itself was bad
+                self.breaker.record_success()
+            # not str(exc): requests puts the full URL in its messages
+            reason = f'status {status}' if status is not None else type(exc).__name__
+            raise SpoonacularError(f'GET {path} failed: {reason}') from exc
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stats['in_flight'] -= 1
+                self._stats['requests'] += 1
+                self._stats['latency_total'] += elapsed
+                self._stats['latency_max'] = max(self._stats['latency_max'], elapsed)
+
+    def metrics(self):
+        """Snapshot of request counters, upstream latency and pool usage."""
+
+        with self._lock:
+            stats = dict(self._stats)
+        stats['circuit'] = self.breaker.state
+        stats['circuit_trips'] = self.breaker.trips
+        stats['quota_left'] = self.quota_left
+        if self.budget:
+            stats['budget_remaining'] = self.budget.remaining
+            stats['budget_denied'] = self.budget.denied
+        stats['latency_avg'] = (stats['latency_total'] / stats['requests']
+                                if stats['requests'] else 0.0)
+
+        pools = self.adapter.poolmanager.pools
+        stats['pools'] = {}
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats['pools'][f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle': pool.pool.qsize() if pool.pool else 0,
+                'maxsize': self.adapter._pool_maxsize,
+            }
+        return stats
+
+    def _check_limits(self, res):
+        """Open the circuit on 429 or when the daily quota is used up."""
+
+        quota_left = res.headers.get('X-API-Quota-Left')
+        if quota_left is not None:
+            try:
+                self.quota_left = float(quota_left)
+            except ValueError:
+                pass
+            else:
+                if self.budget:
+                    self.budget.observe_quota(self.quota_left)
+                if self.quota_left <= 0:
+                    self.breaker.trip(seconds_until_quota_reset())
+
+        if res.status_code == 429:
+            retry_after = res.headers.get('Retry-After', '')
+            self.breaker.trip(float(retry_after) if retry_after.isdigit()
+                              else self.breaker.cooloff)
+
+    def _count(self, name, value):
+        with self._lock:
+            self._stats[name] += value
+
+    @staticmethod
+    def _retries_of(res):
+        retries = getattr(res.raw, 'retries', None)
+        return len(retries.history) if retries else 0
+
+
+client = SpoonacularClient.from_env()
@@ -1 +1,154 @@
-console.log('Hi');
\ No newline at end of file
+// Progressive enhancement: favorites and paging through the JSON API
+// (api.py) instead of full page reloads. Without JavaScript, or if a
+// request fails, the plain forms and links still work.
+
+(function () {
+  if (typeof axios === 'undefined') return;
+
+  axios.defaults.headers.common['X-Requested-With'] = 'XMLHttpRequest';
+
+  // ---------------recipe cards-----------
+
+  function cardColumn(recipe, columnClass, action) {
+    const column = document.createElement('div');
+    column.className = columnClass;
+    const card = document.createElement('div');
+    card.className = 'card';
+
+    const link = document.createElement('a');
+    link.href = `/recipes/${recipe.id}`;
+    link.className = 'details';
+    const title = document.createElement('h6');
+    title.className = 'card-title';
+    title.textContent = recipe.title;
+    const img = document.createElement('img');
+    img.src = recipe.image || '';
+    img.alt = '';
+    img.className = 'card-img-top';
+    link.append(title, img);
+    card.append(link);
+
+    if (action) {
+      const form = document.createElement('form');
+      form.method = 'POST';
+      // same id as the server-rendered forms, app.css styles them by id
+      form.id = action.formId;
+      form.className = action.formClass;
+      form.dataset.recipeId = recipe.id;
+      const button = document.createElement('button');
+      button.className = 'side-btn';
+      const input = document.createElement('input');
+      input.type = 'integer';
+      input.name = action.inputName;
+      input.hidden = true;
+      input.value = recipe.id;
+      const icon = document.createElement('i');
+      icon.className = action.icon;
+      button.append(input, icon);
+      form.append(button);
+      card.append(form);
+    }
+
+    column.append(card);
+    return column;
+  }
+
+  const SAVE = {formId: 'save-btn', formClass: 'fav-form', inputName: 'rec_to_save', icon: 'fas fa-heart'};
+  const DELETE = {formId: 'delete-btn', formClass: 'unfav-form', inputName: 'rec_to_delete', icon: 'fa-solid fa-trash-can'};
+
+  // ---------------favorites-----------
+
+  document.addEventListener('submit', async function (evt) {
+    const form = evt.target;
+    const adding = form.classList.contains('fav-form');
+    if (!adding && !form.classList.contains('unfav-form')) return;
+    evt.preventDefault();
+
+    const id = form.dataset.recipeId;
+    try {
+      if (adding) {
+        await axios.post(`/api/favorites/${id}`);
+        form.remove();
+      } else {
+        await axios.delete(`/api/favorites/${id}`);
+        form.closest('.card').parentElement.remove();
+      }
+    } catch (err) {
+      form.submit();
+    }
+  });
+
+  const more = document.querySelector('.more-favs');
+  if (more) {
+    more.addEventListener('click', async function (evt) {
+      evt.preventDefault();
+      try {
+        const res = await axios.get('/api/favorites', {params: {after: more.dataset.after}});
+        const row = document.getElementById('fav-cards');
+        for (const recipe of res.data.recipes) {
+          row.append(cardColumn(recipe, 'col-12 col-md-6 col-lg-4 col-xxl-3', DELETE));
+        }
+        if (res.data.next_after) {
+          more.dataset.after = res.data.next_after;
+          more.href = `?after=${res.data.next_after}`;
+        } else {
+          more.remove();
+        }
+      } catch (err) {
+        window.location = more.href;
+      }
+    });
+  }
+
+  // ---------------paging-----------
+
+  const cards = document.querySelector('[data-paging]');
+  const nav = document.querySelector('[data-paging-nav]');
+  if (!cards || !nav) return;
+
+  const feed = cards.dataset.paging === 'feed';
+
+  async function showPage(position) {
+    const res = feed
+      ? await axios.get('/api/feed', {params: {offset: position}})
+      : await axios.get('/api/recipes', {params: {index: position}});
+    const data = res.data;
+
+    for (const column of Array.from(cards.children)) {
+      if (column !== nav) column.remove();
+    }
+    for (const recipe of data.recipes) {
+      const column = feed
+        ? cardColumn(recipe, 'col-12 col-lg-6 col-xl-4 col-xxl-3')
+        : cardColumn(recipe, 'col-12 col-lg-6 ', recipe.favorite ? null : SAVE);
+      cards.insertBefore(column, nav.parentElement === cards ? nav : null);
+    }
+    if (feed) {
+      cards.dataset.offset = data.offset;
+    } else {
+      cards.dataset.index = data.index;
+    }
+  }
+
+  nav.addEventListener('click', async function (evt) {
+    const button = evt.target;
+    if (button.type !== 'submit') return;
+    evt.preventDefault();
+
+    const back = button.name === 'back' || button.name === 'res_back';
+    const position = Number(feed ? cards.dataset.offset : cards.dataset.index);
+    const step = Number(cards.dataset.pageSize);
+    const target = Math.max(back ? position - step : position + step, 0);
+    try {
+      await showPage(target);
+    } catch (err) {
+      // let the server handle it the old way
+      const fallback = document.createElement('input');
+      fallback.type = 'hidden';
+      fallback.name = button.name;
+      fallback.value = button.value;
+      nav.append(fallback);
+      nav.submit();
+    }
+  });
+})();
@@ -0,0 +1,56 @@
+from unittest import TestCase
+from unittest.mock import patch
+from budget import Budget, BACKGROUND, INTERACTIVE, current_priority, estimate_points, priority
+
+class BudgetTestCase(TestCase):
+    """Test API points budget"""
+
+    def test_estimate_points(self):
+        """complexSearch is charged per result, other calls 1 point"""
+
+        self.assertEqual(estimate_points('/recipes/complexSearch', 'number=100&offset=0'), 2)
+        self.assertEqual(estimate_points('/recipes/complexSearch', '&sort=popularity'), 1.1)
+        self.assertEqual(estimate_points('/recipes/716429/information', 'includeNutrition=true'), 1)
+
+    def test_take(self):
+        """Points are taken until the bucket is empty"""
+
+        budget = Budget(daily_points=10, reserve=0)
+        with patch('budget.time.time', return_value=budget._local_updated):
+            self.assertTrue(budget.take(6))
+            self.assertFalse(budget.take(6))
+            self.assertTrue(budget.take(4))
+        self.assertEqual(budget.remaining, 0)
+        self.assertEqual(budget.denied, 1)
+
+    def test_refill(self):
+        """Bucket refills with the daily rate, up to its capacity"""
+
+        budget = Budget(daily_points=24 * 60 * 60, reserve=0)
+        start = budget._local_updated
+        with patch('budget.time.time', return_value=start):
+            budget.take(100)
+        with patch('budget.time.time', return_value=start + 30):
+            budget.refund(0)
+        self.assertEqual(budget.remaining, 24 * 60 * 60 - 70)
+
+    def test_background_reserve(self):
+        """Background work can't use the interactive reserve"""
+
+        budget = Budget(daily_points=10, reserve=0.5)
+        with patch('budget.time.time', return_value=budget._local_updated):
+            with priority(BACKGROUND):
+                self.assertEqual(current_priority(), BACKGROUND)
+                self.assertTrue(budget.take(5))
+                self.assertFalse(budget.take(1))
+            self.assertEqual(current_priority(), INTERACTIVE)
+            self.assertTrue(budget.take(5))
+            self.assertTrue(budget.is_low())
+        self.assertEqual(budget.shrink(100, minimum=8), 25)
+
+    def test_observe_quota(self):
+        """Budget never exceeds the quota upstream reports"""
+
+        budget = Budget(daily_points=150)
+        budget.observe_quota(12.5)
+        self.assertLessEqual(budget.remaining, 12.6)
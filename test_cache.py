@@ -0,0 +1,169 @@
+import time
+from unittest import TestCase
+from unittest.mock import patch
+from threading import Event, Thread
+from cache import TTLCache, ResponseCache, SingleFlight, normalize_params
+
+class TTLCacheTestCase(TestCase):
+    """Test in-process LRU cache"""
+
+    def test_get_set(self):
+        """Stored value is returned and counted as a hit"""
+
+        cache = TTLCache()
+        cache.set('a', [1, 2], 60)
+
+        self.assertEqual(cache.get('a'), [1, 2])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_expired(self):
+        """Expired entries are dropped"""
+
+        cache = TTLCache()
+        with patch('cache.time.time', return_value=1000):
+            cache.set('a', 'value', 10)
+        with patch('cache.time.time', return_value=1011):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        """Least recently used entry is evicted when cache is full"""
+
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+
+class ResponseCacheTestCase(TestCase):
+    """Test response cache outside of app context (local tier only)"""
+
+    def test_normalize_params(self):
+        """Same query in different order gives the same key"""
+
+        self.assertEqual(normalize_params('&diet=vegan&number=4'),
+                         normalize_params('number=4&diet=vegan '))
+        self.assertNotIn('apiKey', normalize_params('apiKey=123&number=4'))
+
+    def test_fetch(self):
+        """Second fetch of the same request is served from cache"""
+
+        cache = ResponseCache({'search': 60})
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return ['recipe']
+
+        self.assertEqual(cache.fetch('search', 'number=4&diet=vegan', fetch), ['recipe'])
+        self.assertEqual(cache.fetch('search', '&diet=vegan&number=4', fetch), ['recipe'])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['local_hits'], 1)
+
+    def test_stale_while_revalidate(self):
+        """Stale response is served at once and refreshed in the background"""
+
+        refreshes = []
+        cache = ResponseCache({'recipe': 10}, {'recipe': 100}, submit=refreshes.append)
+        with patch('cache.time.time', return_value=1000):
+            cache.set('recipe', 'id=1', {'title': 'old'})
+
+        with patch('cache.time.time', return_value=1050):
+            value = cache.fetch('recipe', 'id=1', lambda: {'title': 'new'})
+            self.assertEqual(value, {'title': 'old'})
+            self.assertEqual(len(refreshes), 1)
+
+            # background refresh stores the new copy
+            refreshes[0]()
+            self.assertEqual(cache.get('recipe', 'id=1'), {'title': 'new'})
+        self.assertEqual(cache.stats()['stale_hits'], 1)
+
+    def test_fresh_only(self):
+        """With allow_stale=False a stale response is fetched again"""
+
+        refreshes = []
+        cache = ResponseCache({'recipe': 10}, {'recipe': 100}, submit=refreshes.append)
+        with patch('cache.time.time', return_value=1000):
+            cache.set('recipe', 'id=1', {'title': 'old'})
+
+        with patch('cache.time.time', return_value=1050):
+            value = cache.fetch('recipe', 'id=1', lambda: {'title': 'new'}, allow_stale=False)
+            self.assertEqual(value, {'title': 'new'})
+            self.assertEqual(cache.get('recipe', 'id=1'), {'title': 'new'})
+        self.assertEqual(refreshes, [])
+        self.assertEqual(cache.stats()['stale_hits'], 0)
+
+    def test_lease_held_elsewhere(self):
+        """While another worker holds the lease its result is used"""
+
+        cache = ResponseCache({'recipe': 60})
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return {'title': 'mine'}
+
+        with patch.object(cache, '_take_lease', return_value=None), \
+                patch.object(cache, '_wait_for', return_value={'title': 'theirs'}):
+            self.assertEqual(cache.fetch('recipe', 'id=1', fetch), {'title': 'theirs'})
+        self.assertEqual(calls, [])
+
+        # the holder gave up: fetch ourselves
+        with patch.object(cache, '_take_lease', side_effect=[None, 'token']), \
+                patch.object(cache, '_wait_for', return_value=None):
+            self.assertEqual(cache.fetch('recipe', 'id=2', fetch), {'title': 'mine'})
+        self.assertEqual(len(calls), 1)
+
+
+class SingleFlightTestCase(TestCase):
+    """Test coalescing of concurrent calls"""
+
+    def test_concurrent_calls(self):
+        """Callers arriving while a call is running share its result"""
+
+        flights = SingleFlight()
+        started = Event()
+        release = Event()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'recipe'
+
+        results = []
+        leader = Thread(target=lambda: results.append(flights.do('k', slow_fetch)))
+        leader.start()
+        started.wait(5)
+        followers = [Thread(target=lambda: results.append(flights.do('k', slow_fetch)))
+                     for i in range(3)]
+        for t in followers:
+            t.start()
+        while flights.coalesced < 3:
+            time.sleep(0.01)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+
+        self.assertEqual(results, ['recipe'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_error(self):
+        """Errors are raised and the key can be retried"""
+
+        flights = SingleFlight()
+
+        def fail():
+            raise ValueError('upstream down')
+
+        with self.assertRaises(ValueError):
+            flights.do('k', fail)
+        self.assertEqual(flights.do('k', lambda: 'ok'), 'ok')
@@ -0,0 +1,41 @@
+from unittest import TestCase
+from unittest.mock import patch
+from catalog import prefetch_details, PAGE_SIZE
+from spoonacular import SpoonacularError
+
+PAGES = {0: [{'id': 1}, {'id': 2}, {'id': 3}, {'id': 4}],
+         PAGE_SIZE: [{'id': 5}, {'id': 6}, {'id': 7}, {'id': 8}]}
+
+def fake_page(query, index):
+    return list(PAGES[index]), 8
+
+def fake_recipe(id, allow_stale=True):
+    if id == 3:
+        raise SpoonacularError('failed')
+    return {'id': id}
+
+@patch('catalog.save_recipe')
+@patch('catalog.get_recipe', side_effect=fake_recipe)
+@patch('catalog.missing_details', side_effect=lambda ids: [id for id in ids if id % 2])
+@patch('catalog.get_page', side_effect=fake_page)
+class PrefetchTestCase(TestCase):
+    """Test prefetching recipe details"""
+
+    def test_prefetch(self, page, missing, recipe, save):
+        """Missing details of this page and the next are stored"""
+
+        prefetch_details('&query=soup', 0)
+
+        missing.assert_called_once_with([1, 2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(sorted(c.args[0] for c in recipe.call_args_list), [1, 3, 5, 7])
+        # failed fetch is skipped, the detail view fetches it on demand
+        self.assertEqual([c.args[0]['id'] for c in save.call_args_list], [1, 5, 7])
+
+    def test_low_budget(self, page, missing, recipe, save):
+        """Nothing is prefetched once the budget is down to the reserve"""
+
+        with patch('catalog.client.budget.is_low', return_value=True):
+            prefetch_details('&query=soup', 0)
+
+        page.assert_not_called()
+        recipe.assert_not_called()
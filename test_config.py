@@ -0,0 +1,27 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from config import get_config
+
+class ConfigTestCase(TestCase):
+    """Test settings profiles"""
+
+    def test_production_needs_secret_key(self):
+        """Production refuses to start without SECRET_KEY"""
+
+        with patch.dict(os.environ):
+            os.environ.pop('SECRET_KEY', None)
+            with self.assertRaises(RuntimeError):
+                get_config('production')
+
+            os.environ['SECRET_KEY'] = 'not-a-default'
+            self.assertEqual(get_config('production').SECRET_KEY, 'not-a-default')
+
+    def test_testing_profile(self):
+        """Testing works without SECRET_KEY and skips CSRF"""
+
+        with patch.dict(os.environ):
+            os.environ.pop('SECRET_KEY', None)
+            config = get_config('testing')
+        self.assertTrue(config.SECRET_KEY)
+        self.assertFalse(config.WTF_CSRF_ENABLED)
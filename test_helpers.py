@@ -1,6 +1,8 @@
 import os
 from unittest import TestCase
-from helper import get_recipes, get_recipe, convert_to_list
+from unittest.mock import patch
+from flask import Flask
+from helper import get_recipes, get_recipe, get_recipe_many, convert_to_list, release_db_connection
 
 class HelperTestCase(TestCase):
     """Test views for users."""
@@ -39,9 +41,36 @@ class HelperTestCase(TestCase):
         self.assertIs(recipe2['vegan'], True)
         self.assertIn('Pasta', recipe2['title'])
 
+    def test_get_recipe_many(self):
+        """Test getting several recipes concurrently"""
+
+        ids = [716429, 646512]
+        recipes = get_recipe_many(ids)
+
+        # results come back in the requested order
+        self.assertEqual([r['id'] for r in recipes], ids)
+        self.assertIn('healthScore', recipes[1].keys())
+
     def test_convert_to_list(self):
         """Test formatting user's input"""
 
         self.assertEqual(convert_to_list('{"eggs","butter","milk"}'), ['eggs', 'butter', 'milk'])
 
 
+class ReleaseConnectionTestCase(TestCase):
+    """Test handing db.session's connection back before upstream calls"""
+
+    def test_release(self):
+        """Open read transaction is ended, unsaved changes are kept"""
+
+        app = Flask(__name__)
+        with app.app_context(), patch('helper.db') as db:
+            session = db.session.return_value
+            session.new = session.dirty = session.deleted = ()
+            release_db_connection()
+            session.commit.assert_called_once_with()
+
+            session.commit.reset_mock()
+            session.dirty = ('user',)
+            release_db_connection()
+            session.commit.assert_not_called()
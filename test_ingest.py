@@ -0,0 +1,40 @@
+from unittest import TestCase
+from ingest import sanitize_html, summary_sentences, display_amount, prepare_recipe
+
+class IngestTestCase(TestCase):
+    """Test ingest-time recipe processing"""
+
+    def test_sanitize_html(self):
+        """Only basic formatting survives, without attributes"""
+
+        html = '<ol onclick="x()"><li>Boil <a href="http://x">water</a></li><script>alert(1)</script></ol>'
+        self.assertEqual(sanitize_html(html), '<ol><li>Boil water</li></ol>')
+        self.assertEqual(sanitize_html('<b>1 < 2'), '<b>1 &lt; 2</b>')
+
+    def test_summary_sentences(self):
+        """Sentences with upstream links are dropped"""
+
+        summary = ('Pasta is a <b>vegan</b> main course. '
+                   'Try <a href="https://spoonacular.com/x">this</a> too. '
+                   'Brought to you by Spoonacular.')
+        self.assertEqual(summary_sentences(summary), ['Pasta is a <b>vegan</b> main course.'])
+
+    def test_display_amount(self):
+        """Amounts display like the template used to show them"""
+
+        self.assertEqual(display_amount(2.0), '2')
+        self.assertEqual(display_amount(2.75), '2')
+        self.assertEqual(display_amount(0.25), '0.2')
+        self.assertEqual(display_amount(None), '')
+
+    def test_prepare_recipe(self):
+        """Render section is added, upstream payload kept"""
+
+        recipe = prepare_recipe({'id': 1,
+                                 'instructions': '<p>Mix</p>',
+                                 'extendedIngredients': [{'name': 'flour', 'amount': 1.5, 'unit': 'cup'}]})
+
+        self.assertEqual(recipe['id'], 1)
+        self.assertEqual(recipe['render']['instructions'], '<p>Mix</p>')
+        self.assertEqual(recipe['render']['ingredients'],
+                         [{'name': 'flour', 'amount': '1', 'unit': 'cup'}])
@@ -0,0 +1,107 @@
+import os
+from unittest import TestCase
+from models import db, Job
+
+os.environ['DATABASE_URL'] = "postgresql:///food-test"
+os.environ['APP_CONFIG'] = "testing"
+from app import app
+from jobs import job, enqueue, run_next, MAX_ATTEMPTS
+from spoonacular import SpoonacularBudgetExceeded
+
+db.create_all()
+
+calls = []
+
+@job('test_record')
+def record(*args):
+    calls.append(args)
+
+@job('test_fail')
+def fail():
+    raise ValueError('boom')
+
+@job('test_refused')
+def refused():
+    raise SpoonacularBudgetExceeded('out of API points')
+
+class JobsTestCase(TestCase):
+    """Test background job queue"""
+
+    def setUp(self):
+        Job.query.delete()
+        db.session.commit()
+        calls.clear()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_enqueue_and_run(self):
+        """Queued job runs once and is removed"""
+
+        self.assertTrue(enqueue('test_record', 1, 'a'))
+
+        self.assertTrue(run_next())
+        self.assertFalse(run_next())
+        self.assertEqual(calls, [(1, 'a')])
+        self.assertEqual(Job.query.count(), 0)
+
+    def test_enqueue_key(self):
+        """Jobs with the same key are queued once"""
+
+        self.assertTrue(enqueue('test_record', 1, key='one'))
+        self.assertFalse(enqueue('test_record', 1, key='one'))
+        self.assertTrue(enqueue('test_record', 2))
+        self.assertEqual(Job.query.count(), 2)
+
+    def test_delay(self):
+        """Delayed jobs don't run before their time"""
+
+        enqueue('test_record', 1, delay=60)
+
+        self.assertFalse(run_next())
+        self.assertEqual(calls, [])
+
+    def test_failure(self):
+        """Failed job is kept for a retry with its error"""
+
+        enqueue('test_fail')
+
+        self.assertTrue(run_next())
+        failed = Job.query.one()
+        self.assertEqual(failed.attempts, 1)
+        self.assertIn('boom', failed.last_error)
+        # retried later, not right away
+        self.assertFalse(run_next())
+
+        failed.attempts = MAX_ATTEMPTS
+        db.session.commit()
+        self.assertFalse(run_next())
+
+    def test_dead_job_frees_key(self):
+        """A job that used up its attempts doesn't block its key"""
+
+        enqueue('test_fail', key='fail')
+        failed = Job.query.one()
+        failed.attempts = MAX_ATTEMPTS - 1
+        db.session.commit()
+
+        self.assertTrue(run_next())
+        db.session.expire_all()
+        dead = Job.query.one()
+        self.assertEqual(dead.attempts, MAX_ATTEMPTS)
+        self.assertIsNone(dead.key)
+
+        self.assertTrue(enqueue('test_fail', key='fail'))
+        self.assertEqual(Job.query.count(), 2)
+
+    def test_refused_job_deferred(self):
+        """A job refused by the API budget is put back without using an attempt"""
+
+        enqueue('test_refused', key='refused')
+
+        self.assertTrue(run_next())
+        deferred = Job.query.one()
+        self.assertEqual(deferred.attempts, 0)
+        self.assertEqual(deferred.key, 'refused')
+        self.assertIn('out of API points', deferred.last_error)
+        self.assertFalse(run_next())
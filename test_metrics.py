@@ -0,0 +1,75 @@
+from unittest import TestCase
+from flask import Flask, render_template_string
+import metrics
+from metrics import Histogram, timed
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    metrics.init_app(app)
+
+    @app.route('/slow')
+    def slow():
+        with timed('upstream'):
+            pass
+        return render_template_string('{{ n }}', n=1)
+
+    return app
+
+class HistogramTestCase(TestCase):
+    """Test Prometheus histogram"""
+
+    def test_render(self):
+        """Buckets are cumulative and labelled"""
+
+        hist = Histogram('test_seconds', 'Test.', ('route',), buckets=(0.1, 1))
+        hist.observe(0.05, 'a')
+        hist.observe(0.5, 'a')
+        hist.observe(5, 'a')
+        lines = hist.render()
+
+        self.assertIn('test_seconds_bucket{route="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{route="a",le="1"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{route="a"} 3', lines)
+
+class RequestMetricsTestCase(TestCase):
+    """Test per-request timers and /metrics"""
+
+    def test_metrics_endpoint(self):
+        """Route and phase timings show up on /metrics"""
+
+        app = make_app()
+        client = app.test_client()
+        client.get('/slow')
+        body = client.get('/metrics').get_data(as_text=True)
+
+        self.assertIn('http_request_duration_seconds_count{endpoint="slow",method="GET",status="200"} 1', body)
+        self.assertIn('http_request_phase_seconds_count{endpoint="slow",phase="render"}', body)
+        self.assertIn('http_request_db_queries_bucket{endpoint="slow",le="0"}', body)
+
+    def test_metrics_token(self):
+        """With a token set, /metrics needs it"""
+
+        client = make_app(METRICS_TOKEN='secret').test_client()
+
+        self.assertEqual(client.get('/metrics').status_code, 404)
+        resp = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(resp.status_code, 200)
+
+    def test_metrics_token_required(self):
+        """Where a token is required, /metrics is off until one is set"""
+
+        client = make_app(METRICS_REQUIRE_TOKEN=True).test_client()
+
+        self.assertEqual(client.get('/metrics').status_code, 404)
+
+    def test_slow_request_log(self):
+        """Slow requests are logged with their phases"""
+
+        app = make_app(SLOW_REQUEST_MS=0.0001)
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            app.test_client().get('/slow')
+
+        self.assertIn('GET /slow', logs.output[0])
+        self.assertIn('render=', logs.output[0])
@@ -1,8 +1,10 @@
 import os
 from unittest import TestCase
 from models import db, User, Recipe, Favorites
+from passwords import PasswordHasher, hasher, hash_rounds
 
 os.environ['DATABASE_URL'] = "postgresql:///food-test"
+os.environ['APP_CONFIG'] = "testing"
 from app import app
 
 db.create_all()
@@ -117,6 +119,18 @@ class UserModelTestCase(TestCase):
         # user is authenticated
         self.assertEqual(new_user, registered_user)
 
+    def test_rehash_on_login(self):
+        """Password hashed at an old cost is rehashed on login"""
+
+        new_user = User.register("new_user1", "new_user1@gmail.com", "newpassword1")
+        new_user.password = PasswordHasher(rounds=4).hash("newpassword1")
+        db.session.commit()
+
+        registered_user = User.authenticate("new_user1", "newpassword1")
+
+        self.assertEqual(new_user, registered_user)
+        self.assertEqual(hash_rounds(registered_user.password), hasher.rounds)
+
     def test_fail_authenticate_user(self):
         """Fail to autenticate user(wrong credentials)"""
 
@@ -126,4 +140,46 @@ class UserModelTestCase(TestCase):
         # could not authenticate user
         self.assertNotEqual(new_user, registered_user)
 
-        
\ No newline at end of file
+    def test_update_preferences(self):
+        """Preferences are stored as lists and compiled into search filters"""
+
+        user = User.query.filter_by(username="user1").first()
+        user.update_preferences(diet=["Vegan", "Paleo"],
+                                intolerances=[],
+                                cuisine=["Greek"],
+                                excludeIngredients="egg, milk")
+        db.session.commit()
+
+        self.assertEqual(user.prefs, {"diet": ["Vegan", "Paleo"], "cuisine": ["Greek"]})
+        self.assertEqual(user.search_filters,
+                         "&excludeIngredients=egg,milk&diet=Vegan&diet=Paleo&cuisine=Greek")
+
+    def test_favorites(self):
+        """Favorites are unique per user and paginated newest first"""
+
+        user = User.query.filter_by(username="user1").first()
+        other = User.query.filter_by(username="user2").first()
+        for i in range(1, 4):
+            db.session.add(Recipe(id=i, title=f"Recipe {i}"))
+        db.session.commit()
+
+        for i in range(1, 4):
+            Favorites.add(user.id, i)
+        Favorites.add(user.id, 1)
+        Favorites.add(other.id, 1)
+        db.session.commit()
+
+        # duplicate was ignored
+        self.assertEqual(Favorites.recipe_ids(user.id), {1, 2, 3})
+
+        recipes, next_after = Favorites.page(user.id, limit=2)
+        self.assertEqual([r.id for r in recipes], [3, 2])
+        recipes, next_after = Favorites.page(user.id, after=next_after, limit=2)
+        self.assertEqual([r.id for r in recipes], [1])
+        self.assertIsNone(next_after)
+
+        # removing a favorite doesn't touch other users
+        Favorites.remove(user.id, 1)
+        db.session.commit()
+        self.assertEqual(Favorites.recipe_ids(user.id), {2, 3})
+        self.assertEqual(Favorites.recipe_ids(other.id), {1})
@@ -0,0 +1,61 @@
+from unittest import TestCase
+from unittest.mock import patch
+from paging import get_page, CHUNK_SIZE
+
+RESULTS = [{'id': i, 'title': f'Recipe {i}'} for i in range(50)]
+
+def fake_search(n, params='', offset=0, allow_stale=True):
+    return {'results': RESULTS[offset:offset + n],
+            'offset': offset,
+            'number': n,
+            'totalResults': len(RESULTS)}
+
+@patch('paging.local_search', return_value=None)
+@patch('paging.prefetch_chunk')
+@patch('paging.search_recipes', side_effect=fake_search)
+class PagingTestCase(TestCase):
+    """Test fetching result pages in chunks"""
+
+    def test_first_page(self, search, prefetch, local):
+        """First page needs only the first chunk"""
+
+        recipes, total = get_page('&query=pasta', 0)
+
+        self.assertEqual([r['id'] for r in recipes], [0, 1, 2, 3])
+        self.assertEqual(total, 50)
+        search.assert_called_once_with(CHUNK_SIZE, '&query=pasta', 0, allow_stale=True)
+        prefetch.assert_not_called()
+
+    def test_prefetch_next_chunk(self, search, prefetch, local):
+        """Next chunk is prefetched close to the end of current one"""
+
+        get_page('&query=pasta', 12)
+
+        prefetch.assert_called_once_with('&query=pasta', CHUNK_SIZE)
+
+    def test_page_across_chunks(self, search, prefetch, local):
+        """Page spanning two chunks is stitched together"""
+
+        recipes, total = get_page('&query=pasta', 18)
+
+        self.assertEqual([r['id'] for r in recipes], [18, 19, 20, 21])
+        self.assertEqual(search.call_count, 2)
+
+    def test_last_page(self, search, prefetch, local):
+        """No prefetch past the result total"""
+
+        recipes, total = get_page('&query=pasta', 48)
+
+        self.assertEqual([r['id'] for r in recipes], [48, 49])
+        prefetch.assert_not_called()
+
+    def test_local_answer(self, search, prefetch, local):
+        """Catalog answers uncached pages once upstream's total is known"""
+
+        local.return_value = {'results': [{'id': 7}], 'totalResults': 45}
+        with patch('paging.search_total', side_effect=lambda n, q, start: 48 if start == 0 else None):
+            recipes, total = get_page('&query=pasta', 24)
+
+        local.assert_called_once_with('&query=pasta', 24, 4, 48)
+        search.assert_not_called()
+        self.assertEqual(total, 45)
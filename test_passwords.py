@@ -0,0 +1,47 @@
+import os
+from unittest import TestCase
+from unittest.mock import patch
+from passwords import PasswordHasher, hash_rounds, default_workers
+
+class PasswordHasherTestCase(TestCase):
+    """Test password hashing service"""
+
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=4, workers=2)
+
+    def test_hash_check(self):
+        """Hashed password checks, wrong one doesn't"""
+
+        hashed = self.hasher.hash('password1')
+
+        self.assertTrue(hashed.startswith('$2b$04$'))
+        self.assertTrue(self.hasher.check(hashed, 'password1'))
+        self.assertFalse(self.hasher.check(hashed, 'password2'))
+        self.assertFalse(self.hasher.check('not a hash', 'password1'))
+
+    def test_needs_rehash(self):
+        """Hashes made at another cost need rehashing"""
+
+        hashed = PasswordHasher(rounds=5, workers=1).hash('password1')
+
+        self.assertEqual(hash_rounds(hashed), 5)
+        self.assertTrue(self.hasher.check(hashed, 'password1'))
+        self.assertTrue(self.hasher.needs_rehash(hashed))
+        self.assertFalse(self.hasher.needs_rehash(self.hasher.hash('password1')))
+
+    def test_default_workers(self):
+        """Cores are split between the app processes of the host"""
+
+        with patch('passwords.os.cpu_count', return_value=8):
+            with patch.dict('passwords.os.environ', {'WEB_CONCURRENCY': '4'}):
+                self.assertEqual(default_workers(), 2)
+            with patch.dict('passwords.os.environ', {'WEB_CONCURRENCY': '17'}):
+                self.assertEqual(default_workers(), 1)
+
+    def test_default_workers_unset(self):
+        """Without WEB_CONCURRENCY one process per core is assumed"""
+
+        with patch('passwords.os.cpu_count', return_value=8), \
+                patch.dict('passwords.os.environ'):
+            os.environ.pop('WEB_CONCURRENCY', None)
+            self.assertEqual(default_workers(), 1)
@@ -0,0 +1,44 @@
+from collections import namedtuple
+from unittest import TestCase
+import numpy as np
+from recommend import feature_matrix, rank
+
+Row = namedtuple('Row', ['ingredients', 'cuisines', 'diets'])
+
+RECIPES = [
+    Row(['pasta', 'tomato', 'basil'], ['italian'], ['vegetarian']),   # 0
+    Row(['pasta', 'tomato', 'garlic'], ['italian'], []),              # 1
+    Row(['tortilla', 'bean', 'salsa'], ['mexican'], ['vegan']),       # 2
+    Row(['pasta', 'basil', 'pine nut'], ['italian'], ['vegetarian']), # 3
+    Row(['rice'], [], []),                                            # 4
+]
+
+class RecommendTestCase(TestCase):
+    """Test recipe vectors and ranking"""
+
+    def test_feature_matrix(self):
+        """One unit-length row per recipe"""
+
+        features = feature_matrix(RECIPES)
+
+        self.assertEqual(features.shape[0], len(RECIPES))
+        norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).ravel())
+        np.testing.assert_allclose(norms, 1)
+
+    def test_rank(self):
+        """Similar recipes first, favorites and unrelated ones left out"""
+
+        ranked = rank(feature_matrix(RECIPES), [[0], [2], []], limit=3)
+
+        self.assertEqual(ranked[0], [3, 1])
+        self.assertEqual(ranked[1], [])
+        self.assertEqual(ranked[2], [])
+
+    def test_rank_batches(self):
+        """Users in different batches are ranked the same way"""
+
+        features = feature_matrix(RECIPES)
+        ranked = rank(features, [[0]] * 150, limit=2)
+
+        self.assertEqual(len(ranked), 150)
+        self.assertTrue(all(r == [3, 1] for r in ranked))
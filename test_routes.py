@@ -3,20 +3,16 @@
 import os
 from unittest import TestCase
 from flask import session
-from models import db, connect_db, User, Recipe, Favorites
+from models import db, connect_db, User, Recipe, Favorites, SessionData
 from forms import UserAddForm, UserLoginForm, UserEditForm
 
 os.environ['DATABASE_URL'] = "postgresql:///food-test"
+os.environ['APP_CONFIG'] = "testing"
 
 from app import app, CURR_USER_KEY, do_login, do_logout
 
 db.create_all()
 
-app.config['WTF_CSRF_ENABLED'] = False
-app.config['TESTING']=True
-app.config['DEBUG_TB_HOST'] = ["don't-show-debug-toolbar"]
-app.config['PRESERVE_CONTEXT_ON_EXCEPTION'] = False
-
 
 class UserViewTestCase(TestCase):
     """Test views for messages."""
@@ -106,6 +102,23 @@ class UserViewTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn('Register', str(resp.data))
     
+    def test_login_new_session(self):
+        """Signing in moves to a new session id, logging out removes it"""
+
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                sess['query'] = '&query=soup'
+            planted = SessionData.query.one().id
+
+            client.post("/signin", json={
+                "username":"testuser",
+                "password":"testuser"})
+            self.assertIsNone(SessionData.query.get(planted))
+            self.assertEqual(SessionData.query.count(), 1)
+
+            client.get('/logout')
+            self.assertEqual(SessionData.query.count(), 0)
+
     def test_user_homepage(self):
         """Test user homepage"""
 
@@ -184,6 +197,40 @@ class UserViewTestCase(TestCase):
             # the recipe is deleted from to user favorites
             self.assertNotIn(removed_from_favs, user.favorites)
 
+    def test_api_favorites(self):
+        """Test adding and removing favorites through the JSON API"""
+
+        headers = {'X-Requested-With': 'XMLHttpRequest'}
+        with app.test_client() as client:
+            with client.session_transaction() as sess:
+                #make sure user is logged in
+                sess[CURR_USER_KEY] = self.testuser_id
+
+            resp = client.post('/api/favorites/646512', headers=headers)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.get_json(), {'recipe_id': 646512, 'favorite': True})
+            self.assertIn(646512, Favorites.recipe_ids(self.testuser_id))
+
+            resp = client.get('/api/favorites')
+            self.assertEqual([r['id'] for r in resp.get_json()['recipes']], [646512])
+
+            resp = client.delete('/api/favorites/646512', headers=headers)
+            self.assertEqual(resp.get_json()['favorite'], False)
+            self.assertNotIn(646512, Favorites.recipe_ids(self.testuser_id))
+
+    def test_api_checks(self):
+        """Test API needs a user and the X-Requested-With header for changes"""
+
+        with app.test_client() as client:
+            resp = client.delete('/api/favorites/646512',
+                                 headers={'X-Requested-With': 'XMLHttpRequest'})
+            self.assertEqual(resp.status_code, 401)
+
+            with client.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser_id
+            resp = client.delete('/api/favorites/646512')
+            self.assertEqual(resp.status_code, 400)
+
     def test_recipe_details(self):
         """Test recipes details view"""
         
@@ -231,9 +278,14 @@ class UserViewTestCase(TestCase):
             user = User.query.get(self.testuser_id)
             
             self.assertEqual(resp.status_code, 200)
-            self.assertEqual(user.diet, "{Vegan}")
-            self.assertEqual(user.intolerances, "{Sesame}")
+            self.assertEqual(user.diet, ["Vegan"])
+            self.assertEqual(user.intolerances, ["Sesame"])
+            self.assertEqual(user.search_filters,
+                             "&excludeIngredients=egg,cheese&diet=Vegan&intolerances=Sesame&cuisine=American")
             self.assertEqual(user.excludeIngredients, "egg, cheese")
+            # the page shown next is the one warmed for the new filters
+            self.assertEqual(session['query'], user.search_filters)
+            self.assertEqual(session['index'], 0)
             self.assertIn("<li>egg</li>", str(resp.data))
             
             
@@ -0,0 +1,61 @@
+from unittest import TestCase
+from search import (normalize_word, ingredient_terms, search_fields, build_query,
+                    covers, has_filters, local_search)
+
+class SearchTestCase(TestCase):
+    """Test local search helpers"""
+
+    def test_normalize_word(self):
+        """Ingredient words are lowercased and singularized"""
+
+        self.assertEqual(normalize_word('Tomatoes'), 'tomato')
+        self.assertEqual(normalize_word('berries'), 'berry')
+        self.assertEqual(normalize_word('eggs'), 'egg')
+        self.assertEqual(normalize_word('Swiss'), 'swiss')
+
+    def test_ingredient_terms(self):
+        """Multi-word ingredient gives its words and full name"""
+
+        self.assertEqual(ingredient_terms('Cherry Tomatoes'),
+                         {'cherry', 'tomato', 'cherry tomato'})
+
+    def test_search_fields(self):
+        """Search columns are built from recipe details"""
+
+        fields = search_fields({
+            'title': 'Vegan Pasta',
+            'vegan': True,
+            'dairyFree': True,
+            'diets': ['Vegan'],
+            'cuisines': ['Italian'],
+            'extendedIngredients': [{'name': 'eggplants'}],
+            'nutrition': {'nutrients': [{'name': 'Calories', 'amount': 420.5}]},
+        })
+
+        self.assertEqual(fields['ingredients'], ['eggplant'])
+        self.assertEqual(fields['diets'], ['dairy free', 'vegan'])
+        self.assertEqual(fields['cuisines'], ['italian'])
+        self.assertEqual(fields['calories'], 420.5)
+
+    def test_unsupported_filters(self):
+        """Filters that can't be answered locally go upstream"""
+
+        self.assertIsNone(build_query('&diet=Ketogenic'))
+        self.assertIsNone(build_query('&intolerances=Peanut'))
+        self.assertIsNone(build_query('&sort=popularity'))
+
+    def test_coverage(self):
+        """Local answers need most of upstream's total"""
+
+        self.assertTrue(covers(95, 100))
+        self.assertFalse(covers(40, 900))
+        self.assertFalse(covers(0, 0))
+
+    def test_no_filters(self):
+        """Searches without filters always go upstream"""
+
+        self.assertFalse(has_filters(''))
+        self.assertFalse(has_filters('&query=&diet='))
+        self.assertTrue(has_filters('&diet=Vegan'))
+        self.assertIsNone(local_search('', 0, 4, upstream_total=10))
+        self.assertIsNone(local_search('&query=soup', 0, 4, upstream_total=None))
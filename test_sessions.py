@@ -0,0 +1,32 @@
+from unittest import TestCase
+from sessions import ServerSession
+
+class ServerSessionTestCase(TestCase):
+    """Test change tracking of server-side sessions"""
+
+    def test_same_value(self):
+        """Assigning the value a key already has isn't a change"""
+
+        session = ServerSession({'total': 40, 'card': [1, 'ann', None]}, sid='abc')
+        session['total'] = 40
+        session['card'] = [1, 'ann', None]
+        self.assertFalse(session.modified)
+
+        session['total'] = 41
+        self.assertTrue(session.modified)
+
+    def test_changed_in_place(self):
+        """A list changed in place and assigned again is saved"""
+
+        session = ServerSession({'card': [1, 'ann', None]}, sid='abc')
+        card = session['card']
+        card[1] = 'bob'
+        session['card'] = card
+        self.assertTrue(session.modified)
+
+    def test_new_key(self):
+        """New keys are changes, even when set to None"""
+
+        session = ServerSession(sid='abc')
+        session['query'] = None
+        self.assertTrue(session.modified)
@@ -0,0 +1,153 @@
+import json
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from unittest import TestCase
+from spoonacular import SpoonacularClient, SpoonacularError, SpoonacularUnavailable, CircuitBreaker
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Stands in for Spoonacular: fails `failures` times, then answers."""
+
+    failures = 0
+    status = 503
+    headers = {}
+
+    def do_GET(self):
+        cls = type(self)
+        cls.last_path = self.path
+        cls.last_key = self.headers.get('x-api-key')
+        if cls.failures > 0:
+            cls.failures -= 1
+            self.send_response(cls.status)
+            for name, value in cls.headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        body = json.dumps({'results': [{'id': 1, 'title': 'Pasta'}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SpoonacularClientTestCase(TestCase):
+    """Test pooled Spoonacular client against a local stub server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), StubHandler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.failures = 0
+        StubHandler.status = 503
+        StubHandler.headers = {}
+
+    def test_get(self):
+        """Successful request returns JSON and updates metrics"""
+
+        client = SpoonacularClient(self.url, 'key')
+        res = client.get('/recipes/complexSearch', '&number=1')
+
+        self.assertEqual(res['results'][0]['title'], 'Pasta')
+        metrics = client.metrics()
+        self.assertEqual(metrics['requests'], 1)
+        self.assertEqual(metrics['in_flight'], 0)
+        self.assertEqual(len(metrics['pools']), 1)
+
+    def test_retry(self):
+        """Request is retried on 5xx"""
+
+        StubHandler.failures = 2
+        client = SpoonacularClient(self.url, 'key', retries=2, backoff=0)
+        res = client.get('/recipes/complexSearch')
+
+        self.assertEqual(len(res['results']), 1)
+        self.assertEqual(client.metrics()['retries'], 2)
+
+    def test_rate_limited(self):
+        """429 opens the circuit at once instead of sleeping out Retry-After"""
+
+        StubHandler.failures = 3
+        StubHandler.status = 429
+        StubHandler.headers = {'Retry-After': '120'}
+        client = SpoonacularClient(self.url, 'key', retries=2, backoff=0)
+
+        start = time.perf_counter()
+        with self.assertRaises(SpoonacularError):
+            client.get('/recipes/complexSearch')
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertEqual(client.metrics()['retries'], 0)
+        self.assertEqual(client.breaker.state, 'open')
+        self.assertGreater(client.breaker.open_until, time.time() + 100)
+
+        with self.assertRaises(SpoonacularUnavailable):
+            client.get('/recipes/complexSearch')
+        # only the first call reached the stub
+        self.assertEqual(StubHandler.failures, 2)
+
+    def test_api_key_header(self):
+        """API key goes in a header, never in the URL or error messages"""
+
+        client = SpoonacularClient(self.url, 'secret-key')
+        client.get('/recipes/complexSearch', '&number=1')
+
+        self.assertEqual(StubHandler.last_key, 'secret-key')
+        self.assertEqual(StubHandler.last_path, '/recipes/complexSearch?number=1')
+
+        StubHandler.failures = 1
+        StubHandler.status = 404
+        with self.assertRaises(SpoonacularError) as raised:
+            client.get('/recipes/1/information')
+        self.assertNotIn('secret-key', str(raised.exception))
+        self.assertIn('status 404', str(raised.exception))
+
+    def test_error(self):
+        """Request fails after retries are exhausted"""
+
+        StubHandler.failures = 5
+        client = SpoonacularClient(self.url, 'key', retries=1, backoff=0)
+
+        with self.assertRaises(SpoonacularError):
+            client.get('/recipes/complexSearch')
+        self.assertEqual(client.metrics()['errors'], 1)
+
+    def test_circuit_breaker(self):
+        """Upstream isn't called while the circuit is open"""
+
+        StubHandler.failures = 10
+        breaker = CircuitBreaker(threshold=2, cooloff=60)
+        client = SpoonacularClient(self.url, 'key', retries=0, breaker=breaker)
+
+        for i in range(2):
+            with self.assertRaises(SpoonacularError):
+                client.get('/recipes/complexSearch')
+        with self.assertRaises(SpoonacularUnavailable):
+            client.get('/recipes/complexSearch')
+
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(client.metrics()['rejected'], 1)
+        # only the first two calls reached the stub
+        self.assertEqual(StubHandler.failures, 8)
+
+    def test_circuit_half_open(self):
+        """After cool-off one trial call closes the circuit"""
+
+        breaker = CircuitBreaker(threshold=1, cooloff=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'half-open')
+
+        client = SpoonacularClient(self.url, 'key', breaker=breaker)
+        client.get('/recipes/complexSearch')
+        self.assertEqual(breaker.state, 'closed')
@@ -0,0 +1,52 @@
+"""Background job worker, see jobs.py.
+
+Run with `python worker.py`; the Procfile starts it as the `worker`
+process. Stops after the current job on SIGTERM or Ctrl-C.
+"""
+
+import logging
+import os
+import signal
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import app
+from jobs import run_next
+
+# seconds to wait before looking for new jobs when the queue is empty
+POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 1))
+
+log = logging.getLogger('worker')
+
+running = True
+
+
+def stop(signum, frame):
+    global running
+    running = False
+
+
+def main():
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    log.info('Worker started')
+
+    while running:
+        try:
+            # a fresh app context per job, so every job gets a clean db.session
+            with app.app_context():
+                ran = run_next()
+        except SQLAlchemyError:
+            log.exception('Could not fetch jobs')
+            ran = False
+        if not ran:
+            time.sleep(POLL_INTERVAL)
+
+    log.info('Worker stopped')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    main()